@@ -0,0 +1,190 @@
+# benchmark_banco.py
+#
+# Mede as operações de database.py em bancos sintéticos de vários tamanhos
+# (gerados por gerar_dados.py) e grava os tempos em JSON. Com --base, compara
+# com um resultado anterior e termina com código 1 se alguma operação ficou
+# mais lenta que a tolerância.
+#
+# Uso (a partir da pasta App_Financeiro):
+#     python ferramentas/benchmark_banco.py [--tamanhos 1000 100000 1000000]
+#         [--saida resultados.json] [--base baseline.json] [--tolerancia 0.25]
+#         [--pasta-dados pasta_para_reaproveitar_os_bancos_gerados]
+
+from datetime import date, timedelta
+import statistics
+import argparse
+import platform
+import tempfile
+import sqlite3
+import shutil
+import json
+import time
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import database as db
+import gerar_dados
+
+TAMANHOS = [1000, 100000, 1000000]
+REPETICOES_LEITURA = 20
+REPETICOES_GRAVACAO = 100
+ANOS = 5
+SEMENTE = 42
+LINHAS_LOTE = 10000
+# Diferenças menores que isto são ruído de medição, mesmo que a razão seja grande
+DIFERENCA_MINIMA_MS = 0.05
+
+
+def _medir(funcao, repeticoes):
+    """Roda funcao repeticoes vezes; devolve mediana e mínimo em milissegundos"""
+    tempos = []
+    for i in range(repeticoes):
+        inicio = time.perf_counter()
+        funcao(i)
+        tempos.append((time.perf_counter() - inicio) * 1000)
+    return {
+        "mediana_ms": round(statistics.median(tempos), 4),
+        "min_ms": round(min(tempos), 4),
+        "repeticoes": repeticoes,
+    }
+
+
+def _banco_sintetico(linhas, pasta):
+    """Caminho de um banco com `linhas` transações, gerado só se ainda não existir na pasta"""
+    caminho = os.path.join(pasta, f"sintetico_{linhas}_{ANOS}a_{SEMENTE}.db")
+    if not os.path.exists(caminho):
+        print(f"  gerando {linhas:,} transações...", flush=True)
+        gerar_dados.gerar_banco(caminho + ".tmp", linhas, ANOS, SEMENTE)
+        os.replace(caminho + ".tmp", caminho)
+    return caminho
+
+
+def medir_banco(caminho, pasta_trabalho):
+    """Mede cada operação numa cópia do banco (as gravações alteram o arquivo)"""
+    copia = os.path.join(pasta_trabalho, "financeiro.db")
+    shutil.copyfile(caminho, copia)
+    db.fechar_conexoes()
+    db.DB_PATH = copia
+    db.criar_tabelas(None)
+
+    hoje = date.today()
+    ano_passado = hoje - timedelta(days=365)
+    meio = hoje - timedelta(days=365 * ANOS // 2)
+
+    resultados = {}
+    leituras = {
+        "buscar_mes": lambda i: db.buscar_transacoes_mes_db(None, meio.year, meio.month),
+        "buscar_mes_categoria": lambda i: db.buscar_transacoes_mes_db(None, meio.year, meio.month, "Despesa", "Alimentação"),
+        "busca_texto_periodo": lambda i: db.buscar_transacoes_periodo_db(None, ano_passado, hoje, termo_busca="merc"),
+        "busca_texto_tudo": lambda i: db.buscar_transacoes_db(None, "restaurante"),
+        "totais_por_tipo_mes": lambda i: db.totais_por_tipo_db(None, *db.limites_mes(meio.year, meio.month)),
+        "totais_por_tipo_ano": lambda i: db.totais_por_tipo_db(None, ano_passado, hoje),
+        "totais_por_categoria_ano": lambda i: db.totais_por_categoria_db(None, ano_passado, hoje),
+        "estatisticas_categoria_ano": lambda i: db.estatisticas_por_categoria_db(None, ano_passado, hoje),
+        "existe_duplicata": lambda i: db.existe_duplicata_db(None, "Despesa", "Mercado", 45.0, meio),
+        "categorias": lambda i: db.buscar_categorias_db(None),
+        "metas": lambda i: db.buscar_metas_db(None),
+    }
+    for nome, funcao in leituras.items():
+        resultados[nome] = _medir(funcao, REPETICOES_LEITURA)
+
+    ids = []
+    resultados["inserir"] = _medir(
+        lambda i: ids.append(db.adicionar_transacao_db(None, "Despesa", f"Benchmark {i}", 10 + i, "Lazer", hoje)),
+        REPETICOES_GRAVACAO,
+    )
+    resultados["atualizar"] = _medir(
+        lambda i: db.update_transacao_db(None, ids[i], "Despesa", f"Benchmark {i}*", 20 + i, "Lazer", hoje),
+        REPETICOES_GRAVACAO,
+    )
+    resultados["deletar"] = _medir(lambda i: db.deletar_transacao_db(None, ids[i]), REPETICOES_GRAVACAO)
+    resultados["inserir_lote_10k"] = _medir(
+        lambda i: db.adicionar_transacoes_lote_db(
+            None, gerar_dados.gerar_transacoes(LINHAS_LOTE, 1, SEMENTE + i), ignorar_duplicadas=False
+        ),
+        3,
+    )
+    meta = db.buscar_metas_db(None)[0]
+    resultados["movimentar_meta"] = _medir(lambda i: db.movimentar_meta_db(None, meta.id, 1.0), REPETICOES_GRAVACAO)
+
+    destino = os.path.join(pasta_trabalho, "backup.db")
+    resultados["backup"] = _medir(lambda i: db.fazer_backup_db(None, destino), 3)
+
+    db.fechar_conexoes()
+    return resultados
+
+
+def comparar(atual, base, tolerancia):
+    """Lista (tamanho, operação, base_ms, atual_ms, razão, piorou) das medições presentes nos dois resultados"""
+    comparacao = []
+    for tamanho, operacoes in atual["resultados"].items():
+        anteriores = base["resultados"].get(tamanho, {})
+        for operacao, medida in operacoes.items():
+            if operacao in anteriores:
+                antes = anteriores[operacao]["mediana_ms"]
+                depois = medida["mediana_ms"]
+                razao = depois / antes if antes else 1.0
+                piorou = razao > 1 + tolerancia and depois - antes > DIFERENCA_MINIMA_MS
+                comparacao.append((tamanho, operacao, antes, depois, razao, piorou))
+    return comparacao
+
+
+def comparar_com_base(resultado, caminho_base, tolerancia, largura=28):
+    """Compara com o JSON de uma execução anterior e imprime o relatório; retorna o código de saída (1 se piorou)"""
+    with open(caminho_base, encoding="utf-8") as arquivo:
+        base = json.load(arquivo)
+    comparacao = comparar(resultado, base, tolerancia)
+    pioras = [c for c in comparacao if c[-1]]
+    print(f"\nComparação com {caminho_base} (tolerância {tolerancia:.0%}):")
+    for tamanho, operacao, antes, depois, razao, piorou in comparacao:
+        marca = "  <-- PIOROU" if piorou else ""
+        print(f"  {int(tamanho):>9,} {operacao:<{largura}} {antes:>10.3f} -> {depois:>10.3f} ms  x{razao:.2f}{marca}")
+    if pioras:
+        print(f"FALHA: {len(pioras)} operação(ões) mais lentas que a base.")
+        return 1
+    print("OK: nenhuma operação piorou além da tolerância.")
+    return 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark das operações do banco")
+    parser.add_argument("--tamanhos", type=int, nargs="+", default=TAMANHOS, help="quantidades de transações")
+    parser.add_argument("--saida", default="resultados_banco.json", help="arquivo JSON com os resultados")
+    parser.add_argument("--base", help="JSON de uma execução anterior, para comparar")
+    parser.add_argument("--tolerancia", type=float, default=0.25, help="piora aceita na comparação (0.25 = 25%%)")
+    parser.add_argument("--pasta-dados", help="pasta onde os bancos gerados ficam guardados entre execuções")
+    args = parser.parse_args()
+
+    resultado = {
+        "data": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "python": platform.python_version(),
+        "sqlite": sqlite3.sqlite_version,
+        "plataforma": platform.platform(),
+        "semente": SEMENTE,
+        "resultados": {},
+    }
+    with tempfile.TemporaryDirectory() as temporaria:
+        pasta_dados = args.pasta_dados or temporaria
+        os.makedirs(pasta_dados, exist_ok=True)
+        for tamanho in args.tamanhos:
+            print(f"{tamanho:,} transações", flush=True)
+            caminho = _banco_sintetico(tamanho, pasta_dados)
+            with tempfile.TemporaryDirectory() as trabalho:
+                medidas = medir_banco(caminho, trabalho)
+            resultado["resultados"][str(tamanho)] = medidas
+            for operacao, medida in medidas.items():
+                print(f"  {operacao:<28} {medida['mediana_ms']:>10.3f} ms  (mín {medida['min_ms']:.3f})")
+
+    with open(args.saida, "w", encoding="utf-8") as arquivo:
+        json.dump(resultado, arquivo, indent=2, ensure_ascii=False)
+    print(f"Resultados gravados em {args.saida}")
+
+    if not args.base:
+        return 0
+    return comparar_com_base(resultado, args.base, args.tolerancia)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
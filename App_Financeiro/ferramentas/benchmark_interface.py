@@ -0,0 +1,250 @@
+# benchmark_interface.py
+#
+# Mede os caminhos de atualização da interface (FinancialApp) sem abrir uma
+# janela: o app é construído sobre uma página falsa que só conta as chamadas
+# de update() e os controles na tela. Os bancos vêm de gerar_dados.py, e o
+# resultado é gravado em JSON no mesmo formato de benchmark_banco.py (e pode
+# ser comparado com uma base da mesma forma).
+#
+# Uso (a partir da pasta App_Financeiro):
+#     python ferramentas/benchmark_interface.py [--tamanhos 1000 100000]
+#         [--saida resultados_interface.json] [--base baseline.json] [--tolerancia 0.25]
+#         [--pasta-dados pasta_para_reaproveitar_os_bancos_gerados]
+
+from datetime import date, timedelta
+import statistics
+import argparse
+import platform
+import tempfile
+import shutil
+import json
+import time
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import flet as ft
+import database as db
+import main as app_main
+import benchmark_banco
+
+TAMANHOS = [1000, 100000]
+REPETICOES = 10
+
+
+class PaginaFalsa:
+    """Substitui ft.Page: guarda os controles adicionados e conta as chamadas de update()"""
+
+    def __init__(self):
+        self.controls = []
+        self.overlay = []
+        self.navigation_bar = None
+        self.floating_action_button = None
+        self.snack_bar = None
+        self.platform = ft.PagePlatform.LINUX
+        self.atualizacoes = 0
+
+    def __getattr__(self, nome):
+        # Propriedades de janela/tema que o app só escreve (window_width, theme_mode...)
+        return None
+
+    def clean(self):
+        self.controls.clear()
+
+    def add(self, *controles):
+        self.controls.extend(controles)
+
+    def update(self, *controles):
+        self.atualizacoes += 1
+
+    def open(self, controle):
+        controle.open = True
+
+    def close(self, controle):
+        controle.open = False
+
+    def run_thread(self, funcao, *args, **kwargs):
+        funcao(*args, **kwargs)
+
+    def contar_controles(self):
+        """Total de controles na árvore da página (incluindo overlay e barra de navegação)"""
+        def contar(controle):
+            return 1 + sum(contar(filho) for filho in controle._get_children())
+
+        raizes = self.controls + self.overlay + [c for c in (self.navigation_bar, self.floating_action_button) if c]
+        return sum(contar(c) for c in raizes)
+
+
+class _EventoArquivo:
+    """Resultado de FilePicker com o caminho escolhido"""
+
+    def __init__(self, path):
+        self.path = path
+        self.files = None
+
+
+class _EventoSeta:
+    """Clique numa das setas do mes_selector ("prev" ou "next")"""
+
+    def __init__(self, direcao):
+        self.control = type("Seta", (), {"data": direcao})()
+
+
+def _medir(app, pagina, funcao, repeticoes=REPETICOES):
+    """Tempo até a tela ficar pronta (incluindo leituras em segundo plano), updates por chamada e controles"""
+    tempos = []
+    atualizacoes = []
+    for _ in range(repeticoes):
+        antes = pagina.atualizacoes
+        inicio = time.perf_counter()
+        funcao()
+        app.executor.esperar()
+        tempos.append((time.perf_counter() - inicio) * 1000)
+        atualizacoes.append(pagina.atualizacoes - antes)
+    return {
+        "mediana_ms": round(statistics.median(tempos), 4),
+        "min_ms": round(min(tempos), 4),
+        "repeticoes": repeticoes,
+        "updates": max(atualizacoes),
+        "controles": pagina.contar_controles(),
+    }
+
+
+def _mes_com_varias_paginas(app, meses=12):
+    """Exibe o mês mais recente (até `meses` atrás) com mais de uma página de histórico.
+
+    Retorna quantas páginas ainda faltam carregar nele, ou 0 se nenhum mês tem.
+    O mês atual pode ter começado há poucos dias, então os anteriores também são tentados.
+    """
+    hoje = date.today()
+    for deslocamento in range(meses):
+        ano, mes = divmod(hoje.year * 12 + hoje.month - 1 - deslocamento, 12)
+        app.mes_selecionado = app.mes_selecionado.replace(year=ano, month=mes + 1, day=1)
+        app.atualizar_views()
+        app.executor.esperar()
+        if app.historico_tem_mais:
+            restantes = len(app.historico_linhas) - app.historico_exibidas
+            return -(-restantes // db.TAMANHO_PAGINA_HISTORICO)
+    return 0
+
+
+def medir_app(caminho, pasta_trabalho):
+    copia = os.path.join(pasta_trabalho, "financeiro.db")
+    shutil.copyfile(caminho, copia)
+    db.fechar_conexoes()
+    db.DB_PATH = copia
+
+    resultados = {}
+    pagina = PaginaFalsa()
+    inicio = time.perf_counter()
+    app = app_main.FinancialApp(pagina)
+    app.executor.esperar()
+    resultados["construir_app"] = {
+        "mediana_ms": round((time.perf_counter() - inicio) * 1000, 4),
+        "min_ms": round((time.perf_counter() - inicio) * 1000, 4),
+        "repeticoes": 1,
+        "updates": pagina.atualizacoes,
+        "controles": pagina.contar_controles(),
+    }
+
+    resultados["carregar_dados_iniciais"] = _medir(app, pagina, app.carregar_dados_iniciais)
+    resultados["atualizar_views"] = _medir(app, pagina, app.atualizar_views)
+
+    mes = app.mes_selecionado
+    resumo = app.armazem.resumo_mes(mes.year, mes.month)
+    for indice, nome in enumerate(("geral", "receitas", "despesas")):
+        app.filtro_dashboard.selected_index = indice
+        resultados[f"atualizar_dashboard_view_{nome}"] = _medir(
+            app, pagina, lambda: app.atualizar_dashboard_view(mes, resumo)
+        )
+    app.filtro_dashboard.selected_index = 0
+    resultados["atualizar_dashboard_view_busca"] = _medir(
+        app, pagina, lambda: app.atualizar_dashboard_view(mes, resumo, "merc")
+    )
+    # Páginas seguintes do histórico (sem busca), num mês que tenha mais de uma
+    app.atualizar_dashboard_view(mes, resumo)
+    paginas = _mes_com_varias_paginas(app)
+    if paginas:
+        resultados["carregar_mais_historico"] = _medir(
+            app, pagina, app.carregar_mais_historico, repeticoes=min(REPETICOES, paginas)
+        )
+    else:
+        print("  carregar_mais_historico: nenhum mês recente tem mais de uma página de histórico, não medido")
+    app.mes_selecionado = mes
+    app.atualizar_views()
+    app.executor.esperar()
+    # Ida e volta entre meses vizinhos (o vizinho já foi pré-carregado em segundo plano)
+    setas = [_EventoSeta("prev"), _EventoSeta("next")]
+    cliques = iter(setas * REPETICOES)
+    resultados["mudar_mes"] = _medir(app, pagina, lambda: app.mudar_mes(next(cliques)))
+    resultados["atualizar_carteira"] = _medir(app, pagina, app.atualizar_carteira)
+
+    # Relatórios do último ano: completo, por tipo e por categoria
+    hoje = date.today()
+    app.data_inicio_relatorio.value = (hoje - timedelta(days=365)).strftime("%d/%m/%Y")
+    app.data_fim_relatorio.value = hoje.strftime("%d/%m/%Y")
+    destino = os.path.join(pasta_trabalho, "relatorio.pdf")
+    for nome, tipo, categoria in (("todas", "Todas", "Todas"), ("tipo", "Despesa", "Todas"),
+                                  ("categoria", "Despesa", "Alimentação")):
+        app.filtro_tipo_relatorio.value = tipo
+        app.filtro_categoria_relatorio.value = categoria
+        resultados[f"gerar_relatorio_pdf_{nome}"] = _medir(
+            app, pagina, lambda: app.gerar_relatorio_pdf(_EventoArquivo(destino)), repeticoes=3
+        )
+        if not os.path.exists(destino):
+            raise RuntimeError(f"relatório '{nome}' não foi gerado: {pagina.snack_bar.content.value}")
+        os.remove(destino)
+
+    app.executor.encerrar()
+    db.fechar_conexoes()
+    return resultados
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark das atualizações de tela do app")
+    parser.add_argument("--tamanhos", type=int, nargs="+", default=TAMANHOS, help="quantidades de transações")
+    parser.add_argument("--saida", default="resultados_interface.json", help="arquivo JSON com os resultados")
+    parser.add_argument("--base", help="JSON de uma execução anterior, para comparar")
+    parser.add_argument("--tolerancia", type=float, default=0.25, help="piora aceita na comparação (0.25 = 25%%)")
+    parser.add_argument("--pasta-dados", help="pasta onde os bancos gerados ficam guardados entre execuções")
+    args = parser.parse_args()
+
+    resultado = {
+        "data": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "python": platform.python_version(),
+        "flet": ft.version.version,
+        "plataforma": platform.platform(),
+        "semente": benchmark_banco.SEMENTE,
+        "resultados": {},
+    }
+    with tempfile.TemporaryDirectory() as temporaria:
+        pasta_dados = args.pasta_dados or temporaria
+        os.makedirs(pasta_dados, exist_ok=True)
+        for tamanho in args.tamanhos:
+            print(f"{tamanho:,} transações", flush=True)
+            caminho = benchmark_banco._banco_sintetico(tamanho, pasta_dados)
+            with tempfile.TemporaryDirectory() as trabalho:
+                # Os gráficos temporários do relatório são gravados na pasta atual
+                pasta_atual = os.getcwd()
+                os.chdir(trabalho)
+                try:
+                    medidas = medir_app(caminho, trabalho)
+                finally:
+                    os.chdir(pasta_atual)
+            resultado["resultados"][str(tamanho)] = medidas
+            for operacao, medida in medidas.items():
+                print(f"  {operacao:<36} {medida['mediana_ms']:>10.3f} ms  "
+                      f"{medida['updates']:>3} updates  {medida['controles']:>6} controles")
+
+    with open(args.saida, "w", encoding="utf-8") as arquivo:
+        json.dump(resultado, arquivo, indent=2, ensure_ascii=False)
+    print(f"Resultados gravados em {args.saida}")
+
+    if not args.base:
+        return 0
+    return benchmark_banco.comparar_com_base(resultado, args.base, args.tolerancia, largura=36)
+
+
+if __name__ == "__main__":
+    sys.exit(main())
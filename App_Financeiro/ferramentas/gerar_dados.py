@@ -0,0 +1,142 @@
+# gerar_dados.py
+#
+# Gera um financeiro.db sintético para testes de volume e benchmarks.
+# Os dados seguem o padrão de uso do app: salário e contas fixas todo mês,
+# muitas despesas pequenas (alimentação, transporte), algumas grandes, e
+# metas com parte do valor já guardado. A mesma semente gera sempre o mesmo
+# banco.
+#
+# Uso (a partir da pasta App_Financeiro):
+#     python ferramentas/gerar_dados.py destino.db [--linhas 100000] [--anos 5] [--semente 42]
+
+from datetime import date, timedelta
+import argparse
+import random
+import time
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import database as db
+
+# Categorias criadas além das padrão, como um usuário faria
+CATEGORIAS_EXTRAS = [("Saúde", "Despesa"), ("Educação", "Despesa"), ("Vendas", "Receita")]
+
+# (tipo, categoria, descrições, mediana do valor em reais, dispersão, peso)
+# Valores seguem uma log-normal: a maioria perto da mediana, alguns bem maiores
+PERFIS = [
+    ("Despesa", "Alimentação", ["Mercado", "Padaria", "Restaurante", "Lanche", "iFood", "Açougue", "Feira"], 45, 0.8, 40),
+    ("Despesa", "Transporte", ["Uber", "Combustível", "Ônibus", "Estacionamento", "Pedágio"], 30, 0.7, 20),
+    ("Despesa", "Lazer", ["Cinema", "Show", "Bar", "Streaming", "Viagem", "Livraria"], 60, 1.0, 10),
+    ("Despesa", "Contas", ["Farmácia", "Telefone", "Internet", "Assinatura"], 80, 0.6, 8),
+    ("Despesa", "Saúde", ["Consulta", "Exame", "Farmácia"], 120, 0.7, 4),
+    ("Despesa", "Educação", ["Curso", "Material escolar", "Livro"], 150, 0.8, 2),
+    ("Despesa", "Outras Despesas", ["Presente", "Doação", "Conserto", "Compra online"], 70, 1.1, 6),
+    ("Receita", "Freelance", ["Projeto", "Consultoria", "Aula particular"], 800, 0.6, 3),
+    ("Receita", "Vendas", ["Venda usado", "Venda online"], 150, 0.9, 2),
+    ("Receita", "Outras Receitas", ["Reembolso", "Cashback", "Pix recebido"], 50, 0.9, 3),
+]
+
+# Lançamentos de todo mês: (tipo, categoria, descrição, dia, valor base)
+FIXOS_MENSAIS = [
+    ("Receita", "Salário", "Salário", 5, 5200.0),
+    ("Despesa", "Contas", "Aluguel", 10, 1800.0),
+    ("Despesa", "Contas", "Conta de luz", 15, 180.0),
+    ("Despesa", "Contas", "Conta de água", 18, 90.0),
+    ("Receita", "Investimentos", "Rendimento", 28, 120.0),
+]
+
+METAS = [("Reserva de emergência", 30000.0), ("Viagem", 8000.0), ("Carro novo", 60000.0), ("Notebook", 6000.0)]
+
+
+def gerar_transacoes(linhas, anos=5, semente=42, fim=None):
+    """Gera `linhas` transações (dicts no formato de adicionar_transacoes_lote_db) em ordem de data.
+
+    As transações cobrem os `anos` anteriores a `fim` (hoje, por padrão);
+    os lançamentos fixos de cada mês contam dentro do total de linhas.
+    """
+    aleatorio = random.Random(semente)
+    fim = fim or date.today()
+    inicio = fim - timedelta(days=365 * anos)
+    total_dias = (fim - inicio).days + 1
+    pesos = [perfil[-1] for perfil in PERFIS]
+
+    mes_atual = None
+    for i in range(linhas):
+        dia = inicio + timedelta(days=i * total_dias // linhas)
+        if (dia.year, dia.month) != mes_atual:
+            mes_atual = (dia.year, dia.month)
+            fixos = list(FIXOS_MENSAIS)
+        # Um lançamento fixo sai no primeiro dia gerado a partir do seu dia do
+        # mês, o que mantém a sequência em ordem de data
+        if fixos and dia.day >= fixos[0][3]:
+            tipo, categoria, descricao, _dia, base = fixos.pop(0)
+            yield {
+                "tipo": tipo,
+                "descricao": descricao,
+                "valor": round(base * aleatorio.uniform(0.95, 1.05), 2),
+                "categoria": categoria,
+                "data": dia,
+            }
+            continue
+        tipo, categoria, descricoes, mediana, dispersao, _peso = aleatorio.choices(PERFIS, pesos)[0]
+        yield {
+            "tipo": tipo,
+            "descricao": aleatorio.choice(descricoes),
+            "valor": round(max(aleatorio.lognormvariate(0, dispersao) * mediana, 1.0), 2),
+            "categoria": categoria,
+            "data": dia,
+        }
+
+
+def gerar_banco(caminho, linhas, anos=5, semente=42, ao_progresso=None):
+    """Cria (ou completa) o banco em `caminho` com categorias, metas e `linhas` transações"""
+    db.fechar_conexoes()
+    db.DB_PATH = caminho
+    db.criar_tabelas(None)
+
+    existentes = {c.nome for c in db.buscar_categorias_db(None)}
+    for nome, tipo in CATEGORIAS_EXTRAS:
+        if nome not in existentes:
+            db.adicionar_categoria_db(None, nome, tipo)
+
+    aleatorio = random.Random(semente)
+    if not db.buscar_metas_db(None):
+        for nome, objetivo in METAS:
+            db.adicionar_meta_db(None, nome, objetivo)
+        for meta in db.buscar_metas_db(None):
+            db.atualizar_valor_meta_db(None, meta.id, round(meta.valor_objetivo * aleatorio.uniform(0.05, 0.9), 2))
+
+    resultado = db.adicionar_transacoes_lote_db(
+        None, gerar_transacoes(linhas, anos, semente), tamanho_lote=10000,
+        ao_progresso=ao_progresso, ignorar_duplicadas=False,
+    )
+    db.fechar_conexoes()
+    return resultado
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Gera um banco financeiro sintético")
+    parser.add_argument("destino", help="arquivo .db a criar")
+    parser.add_argument("--linhas", type=int, default=100000, help="quantidade de transações")
+    parser.add_argument("--anos", type=int, default=5, help="anos de histórico")
+    parser.add_argument("--semente", type=int, default=42, help="semente do gerador aleatório")
+    args = parser.parse_args()
+
+    if os.path.exists(args.destino):
+        print(f"Já existe: {args.destino} (apague antes de gerar de novo)")
+        return 1
+
+    def progresso(resultado):
+        print(f"\r{resultado['importadas']:,} / {args.linhas:,} transações", end="", flush=True)
+
+    inicio = time.perf_counter()
+    resultado = gerar_banco(args.destino, args.linhas, args.anos, args.semente, progresso)
+    print(f"\n{resultado['importadas']:,} transações geradas em {time.perf_counter() - inicio:.1f} s "
+          f"({resultado['rejeitadas']} rejeitadas)")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
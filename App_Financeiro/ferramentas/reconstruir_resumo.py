@@ -0,0 +1,32 @@
+# reconstruir_resumo.py
+#
+# Aplica as migrações pendentes e recalcula a tabela resumo_mensal a partir
+# de transacoes. Útil para bancos que foram editados fora do app.
+#
+# Uso (a partir da pasta App_Financeiro):
+#     python ferramentas/reconstruir_resumo.py [caminho/para/financeiro.db]
+
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import database as db
+
+
+def main():
+    if len(sys.argv) > 1:
+        db.DB_PATH = sys.argv[1]
+    if not os.path.exists(db.DB_PATH):
+        print(f"Banco não encontrado: {db.DB_PATH}")
+        return 1
+
+    db.criar_tabelas(None)
+    db.reconstruir_resumo_mensal_db(None)
+    db.fechar_conexoes()
+    print(f"resumo_mensal reconstruído em {db.DB_PATH}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
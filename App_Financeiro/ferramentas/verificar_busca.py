@@ -0,0 +1,108 @@
+# verificar_busca.py
+#
+# Reproduz a corrida entre buscas no histórico: uma busca lenta ("canjica")
+# ainda está lendo do banco quando o usuário volta para uma busca já feita
+# ("trab"), que é exibida na hora, da memória. A leitura lenta termina
+# depois e não pode cobrir a tela com o resultado antigo. Roda o app sobre a
+# página falsa de benchmark_interface.py, num banco temporário. Termina com
+# código 1 se a tela acabar mostrando outra busca que não a do campo.
+#
+# Uso (a partir da pasta App_Financeiro):
+#     python ferramentas/verificar_busca.py
+
+from datetime import date
+import threading
+import tempfile
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import database as db
+import main as app_main
+from benchmark_interface import PaginaFalsa
+
+ESPERA_MAXIMA = 10  # segundos
+
+
+def _preparar(app):
+    """Grava um mês com as duas descrições e deixa a busca "trab" guardada no armazém"""
+    hoje = date.today()
+    db.adicionar_transacoes_lote_db(None, (
+        {"tipo": "Despesa", "descricao": descricao, "valor": 10.0, "categoria": "Lazer",
+         "data": hoje.replace(day=1 + i % 28)}
+        for i, descricao in enumerate(["Trabalho extra"] * 5 + ["Canjica"] * 5)
+    ))
+    app.armazem.limpar()
+    app.atualizar_views()
+    app.executor.esperar()
+    app.campo_busca.value = "trab"
+    app.buscar_agora(None)
+    app.executor.esperar()
+
+
+def _exibidas(app):
+    return sorted({t.descricao for t in app.historico_linhas})
+
+
+def verificar_leitura_atrasada(app):
+    """A busca lenta termina depois de a busca guardada ser exibida"""
+    liberar = threading.Event()
+    comecou = threading.Event()
+    buscar_mes = app._buscar_mes
+
+    def buscar_mes_lenta(*args):
+        comecou.set()
+        liberar.wait(ESPERA_MAXIMA)
+        return buscar_mes(*args)
+
+    app._buscar_mes = buscar_mes_lenta
+    try:
+        app.campo_busca.value = "canjica"
+        app.buscar_agora(None)
+        if not comecou.wait(ESPERA_MAXIMA):
+            return "a busca lenta não começou"
+        app.campo_busca.value = "trab"
+        app.buscar_agora(None)  # já guardada: exibida na hora, sem banco
+    finally:
+        liberar.set()
+        app._buscar_mes = buscar_mes
+    app.executor.esperar()
+    return _exibidas(app)
+
+
+def verificar_callback_atrasado(app):
+    """O callback da busca antiga chega (já liberado pelo executor) depois da exibição"""
+    app.campo_busca.value = "trab"
+    app.buscar_agora(None)
+    app.executor.esperar()
+    app._exibir_mes(app.mes_selecionado, "canjica")
+    return _exibidas(app)
+
+
+def main():
+    with tempfile.TemporaryDirectory() as pasta:
+        db.DB_PATH = os.path.join(pasta, "financeiro.db")
+        app = app_main.FinancialApp(PaginaFalsa())
+        app.executor.esperar()
+        _preparar(app)
+        resultados = {
+            "leitura atrasada": verificar_leitura_atrasada(app),
+            "callback atrasado": verificar_callback_atrasado(app),
+        }
+        app.executor.encerrar()
+        db.fechar_conexoes()
+
+    falhas = {nome: exibidas for nome, exibidas in resultados.items() if exibidas != ["Trabalho extra"]}
+    if falhas:
+        print("FALHA: a tela não mostra a busca do campo ('trab'):")
+        for nome, exibidas in falhas.items():
+            print(f"  - {nome}: {exibidas}")
+        return 1
+
+    print(f"OK: {len(resultados)} cenários, a tela mostra sempre a busca do campo.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
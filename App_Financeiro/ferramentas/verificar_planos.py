@@ -0,0 +1,38 @@
+# verificar_planos.py
+#
+# Cria um banco temporário com o esquema atual e roda EXPLAIN QUERY PLAN em
+# cada consulta registrada em database.py. Termina com código 1 se alguma
+# delas fizer varredura completa de tabela (ex.: um índice foi removido).
+#
+# Uso (a partir da pasta App_Financeiro):
+#     python ferramentas/verificar_planos.py
+
+import os
+import sys
+import tempfile
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src"))
+
+import database as db
+
+
+def main():
+    with tempfile.TemporaryDirectory() as pasta:
+        db.DB_PATH = os.path.join(pasta, "financeiro.db")
+        db.criar_tabelas(None)
+        problemas = db.verificar_planos_consulta_db(None)
+        db.fechar_conexoes()
+
+    verificadas = sum(1 for _, permitida in db.CONSULTAS.values() if not permitida)
+    if problemas:
+        print(f"FALHA: {len(problemas)} consulta(s) com varredura completa:")
+        for nome, detalhe in problemas:
+            print(f"  - {nome}: {detalhe}")
+        return 1
+
+    print(f"OK: {verificadas} consultas verificadas, todas usam índice.")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,280 @@
+# armazem.py
+#
+# Transações dos meses já abertos no app, mantidas em memória.
+# Depois de uma gravação o app aplica só a mudança aqui (inserir, atualizar,
+# remover) em vez de reler o banco, e recalcula na tela apenas o mês afetado.
+#
+# Cada mês é um balde (ano, mes) com as transações já em ordem (mais recentes
+# primeiro), mantida com bisect a cada delta: trocar de mês é uma consulta ao
+# dicionário e nenhuma atualização de tela precisa ordenar nem converter datas.
+#
+# Cada mês tem um número de versão que muda a cada alteração, inclusive em
+# meses ainda não carregados: uma leitura do banco que começou antes de uma
+# gravação é recusada por carregar_mes() em vez de trazer dados velhos. O
+# resumo e as listas do histórico de um mês ficam guardados até a versão dele
+# mudar. Só os meses usados mais recentemente ficam na memória (LRU).
+#
+# As últimas buscas do dashboard também ficam aqui, como listas de ids por
+# (mês, filtros, termo), e valem enquanto o mês não muda: repetir uma busca
+# não vai ao banco, e refinar um termo ("merc" -> "merca") parte do resultado
+# anterior (ver busca_refinavel).
+
+from collections import OrderedDict
+from bisect import bisect_left
+from modelos import ResumoMes
+import threading
+
+# Meses mantidos em memória; o usado há mais tempo sai quando outro é carregado
+MESES_EM_MEMORIA = 12
+# Resultados de busca guardados (LRU, de todos os meses juntos)
+BUSCAS_EM_MEMORIA = 20
+
+
+def _chave(data):
+    return data.year, data.month
+
+
+def _posicao(transacao):
+    """Chave de ordenação: ordinal da data e id, decrescentes (mais recentes primeiro)"""
+    return -transacao.data.toordinal(), -transacao.id
+
+
+class ArmazemTransacoes:
+    def __init__(self, limite_meses=MESES_EM_MEMORIA, limite_buscas=BUSCAS_EM_MEMORIA):
+        self._lock = threading.Lock()
+        self._limite_meses = limite_meses
+        self._limite_buscas = limite_buscas
+        self._meses = OrderedDict()  # (ano, mes) -> {id: Transacao}, do usado há mais tempo ao mais recente
+        self._ordem = {}          # (ano, mes) -> (posições, transações), listas paralelas em ordem
+        self._por_categoria = {}  # (ano, mes) -> {categoria: set de ids}
+        self._resumos = {}        # (ano, mes) -> ResumoMes, até a próxima alteração no mês
+        self._historicos = {}     # (ano, mes) -> {(tipo, categoria): tupla de transações em ordem}
+        self._buscas = OrderedDict()  # (ano, mes, tipo, categoria, termo) -> (ids em ordem, completa)
+        self._versoes = {}        # (ano, mes) -> alterações desde a última limpeza
+        self._epoca = 0           # muda a cada limpar(): invalida todas as versões
+
+    # -------------------------------------------------------------------------
+    # Carga
+    # -------------------------------------------------------------------------
+
+    def versao(self, ano, mes):
+        """Versão atual do mês; passe-a para carregar_mes() junto com o que foi lido do banco"""
+        with self._lock:
+            return self._epoca, self._versoes.get((ano, mes), 0)
+
+    def carregado(self, ano, mes):
+        with self._lock:
+            return (ano, mes) in self._meses
+
+    def carregar_mes(self, ano, mes, transacoes, versao):
+        """Guarda as transações lidas do mês; recusa (retorna False) se o mês mudou desde a leitura"""
+        with self._lock:
+            if versao != (self._epoca, self._versoes.get((ano, mes), 0)):
+                return False
+            self._meses[(ano, mes)] = {t.id: t for t in transacoes}
+            # O banco já entrega em ordem (data DESC, id DESC): a ordenação só confirma, em O(n)
+            ordenadas = sorted(transacoes, key=_posicao)
+            self._ordem[(ano, mes)] = ([_posicao(t) for t in ordenadas], ordenadas)
+            categorias = self._por_categoria[(ano, mes)] = {}
+            for t in transacoes:
+                categorias.setdefault(t.categoria, set()).add(t.id)
+            while len(self._meses) > self._limite_meses:
+                self._esquecer(next(iter(self._meses)))
+            return True
+
+    def descartar_mes(self, ano, mes):
+        """Esquece o mês (será relido do banco); retorna os meses afetados"""
+        with self._lock:
+            self._descartar((ano, mes))
+            return {(ano, mes)}
+
+    def limpar(self):
+        """Esquece tudo, ex.: depois de importar um extrato ou restaurar um backup"""
+        with self._lock:
+            self._meses.clear()
+            self._ordem.clear()
+            self._por_categoria.clear()
+            self._resumos.clear()
+            self._historicos.clear()
+            self._buscas.clear()
+            self._versoes.clear()
+            self._epoca += 1
+
+    # -------------------------------------------------------------------------
+    # Alterações (deltas)
+    # -------------------------------------------------------------------------
+
+    def inserir(self, transacao):
+        """Acrescenta uma transação gravada; retorna os meses afetados"""
+        with self._lock:
+            self._incluir(transacao)
+            return {_chave(transacao.data)}
+
+    def atualizar(self, antiga, nova):
+        """Troca a versão antiga da transação pela nova (que pode ser de outro mês)"""
+        with self._lock:
+            self._excluir(antiga)
+            self._incluir(nova)
+            return {_chave(antiga.data), _chave(nova.data)}
+
+    def remover(self, transacao):
+        with self._lock:
+            self._excluir(transacao)
+            return {_chave(transacao.data)}
+
+    # -------------------------------------------------------------------------
+    # Consultas
+    # -------------------------------------------------------------------------
+
+    def transacoes_mes(self, ano, mes, tipo=None, categoria=None):
+        """Transações do mês, das mais recentes para as mais antigas (tupla guardada até o mês mudar).
+
+        Retorna None se o mês não está carregado (ou já saiu da memória): quem
+        chama deve agendar a leitura dele.
+        """
+        with self._lock:
+            if (ano, mes) not in self._meses:
+                return None
+            self._meses.move_to_end((ano, mes))
+            historicos = self._historicos.setdefault((ano, mes), {})
+            lista = historicos.get((tipo, categoria))
+            if lista is None:
+                lista = historicos[(tipo, categoria)] = tuple(
+                    t for t in self._ordem[(ano, mes)][1]
+                    if (tipo is None or t.tipo == tipo) and (categoria is None or t.categoria == categoria)
+                )
+            return lista
+
+    def resumo_mes(self, ano, mes):
+        """ResumoMes do mês: uma passada pelas transações, depois reaproveitado até o mês mudar (None se não carregado)"""
+        with self._lock:
+            if (ano, mes) not in self._meses:
+                return None
+            self._meses.move_to_end((ano, mes))
+            resumo = self._resumos.get((ano, mes))
+            if resumo is not None:
+                return resumo
+
+            transacoes = self._meses[(ano, mes)]
+            centavos = {}    # (tipo, categoria) -> total em centavos
+            quantidades = {}
+            for categoria, ids in self._por_categoria[(ano, mes)].items():
+                for i in ids:
+                    t = transacoes[i]
+                    centavos[(t.tipo, categoria)] = centavos.get((t.tipo, categoria), 0) + t.valor_centavos
+                    quantidades[(t.tipo, categoria)] = quantidades.get((t.tipo, categoria), 0) + 1
+
+            resumo = ResumoMes({"Receita": 0, "Despesa": 0}, {"Receita": 0, "Despesa": 0}, {}, {})
+            for tipo, categoria in sorted(centavos):
+                total = centavos[(tipo, categoria)]
+                quantidade = quantidades[(tipo, categoria)]
+                resumo.total_por_tipo[tipo] += total
+                resumo.quantidade_por_tipo[tipo] += quantidade
+                resumo.total_por_categoria.setdefault(tipo, {})[categoria] = total / 100
+                resumo.quantidade_por_categoria.setdefault(tipo, {})[categoria] = quantidade
+            for tipo, total in resumo.total_por_tipo.items():
+                resumo.total_por_tipo[tipo] = total / 100
+
+            self._resumos[(ano, mes)] = resumo
+            return resumo
+
+    # -------------------------------------------------------------------------
+    # Buscas
+    # -------------------------------------------------------------------------
+
+    def busca(self, ano, mes, tipo, categoria, termo):
+        """Resultado guardado de uma busca idêntica no mês carregado, ou None"""
+        with self._lock:
+            chave = (ano, mes, tipo, categoria, termo)
+            if chave not in self._buscas:
+                return None
+            self._buscas.move_to_end(chave)
+            self._meses.move_to_end((ano, mes))
+            return self._resolver(chave)
+
+    def busca_refinavel(self, ano, mes, tipo, categoria, termo):
+        """Resultado de uma busca anterior cujo termo é o começo deste, ou None.
+
+        Só serve uma busca completa (não cortada pelo limite do banco) com os
+        mesmos filtros: o resultado de termo é um subconjunto dela. Entre
+        várias, fica a de termo mais longo (a menor).
+        """
+        with self._lock:
+            candidatas = [
+                chave for chave, (_ids, completa) in self._buscas.items()
+                if completa and chave[:4] == (ano, mes, tipo, categoria)
+                and chave[4] != termo and termo.startswith(chave[4])
+            ]
+            if not candidatas:
+                return None
+            return self._resolver(max(candidatas, key=lambda chave: len(chave[4])))
+
+    def guardar_busca(self, ano, mes, tipo, categoria, termo, transacoes, versao, completa):
+        """Guarda o resultado (recusado, como em carregar_mes, se o mês mudou ou não está carregado)"""
+        with self._lock:
+            if versao != (self._epoca, self._versoes.get((ano, mes), 0)) or (ano, mes) not in self._meses:
+                return False
+            chave = (ano, mes, tipo, categoria, termo)
+            self._buscas[chave] = (tuple(t.id for t in transacoes), completa)
+            self._buscas.move_to_end(chave)
+            while len(self._buscas) > self._limite_buscas:
+                self._buscas.popitem(last=False)
+            return True
+
+    # -------------------------------------------------------------------------
+    # Auxiliares (chamar com o lock adquirido)
+    # -------------------------------------------------------------------------
+
+    def _alterado(self, chave):
+        self._versoes[chave] = self._versoes.get(chave, 0) + 1
+        self._resumos.pop(chave, None)
+        self._historicos.pop(chave, None)
+        self._esquecer_buscas(chave)
+
+    def _esquecer(self, chave):
+        # Tira o mês da memória sem mudar a versão (os dados continuam válidos no banco)
+        self._meses.pop(chave, None)
+        self._ordem.pop(chave, None)
+        self._por_categoria.pop(chave, None)
+        self._resumos.pop(chave, None)
+        self._historicos.pop(chave, None)
+        self._esquecer_buscas(chave)
+
+    def _esquecer_buscas(self, chave):
+        for busca in [b for b in self._buscas if b[:2] == chave]:
+            del self._buscas[busca]
+
+    def _resolver(self, busca):
+        # Ids guardados -> transações do mês (que continua carregado enquanto a busca existir)
+        transacoes = self._meses[busca[:2]]
+        return [transacoes[i] for i in self._buscas[busca][0] if i in transacoes]
+
+    def _descartar(self, chave):
+        self._esquecer(chave)
+        self._alterado(chave)
+
+    def _incluir(self, transacao):
+        chave = _chave(transacao.data)
+        self._alterado(chave)
+        if chave in self._meses:
+            if transacao.id in self._meses[chave]:
+                self._excluir(transacao)  # a mesma linha já veio na carga do mês
+            self._meses[chave][transacao.id] = transacao
+            self._por_categoria[chave].setdefault(transacao.categoria, set()).add(transacao.id)
+            posicoes, ordenadas = self._ordem[chave]
+            i = bisect_left(posicoes, _posicao(transacao))
+            posicoes.insert(i, _posicao(transacao))
+            ordenadas.insert(i, transacao)
+
+    def _excluir(self, transacao):
+        chave = _chave(transacao.data)
+        self._alterado(chave)
+        atual = self._meses.get(chave, {}).pop(transacao.id, None)
+        if atual is not None:
+            posicoes, ordenadas = self._ordem[chave]
+            i = bisect_left(posicoes, _posicao(atual))
+            del posicoes[i], ordenadas[i]
+            ids = self._por_categoria[chave][atual.categoria]
+            ids.discard(atual.id)
+            if not ids:
+                del self._por_categoria[chave][atual.categoria]
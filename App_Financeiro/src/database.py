@@ -1,223 +1,1391 @@
 import flet as ft
 import sqlite3
-from datetime import datetime
+import threading
+import itertools
+import atexit
+from contextlib import contextmanager, nullcontext
+from calendar import monthrange
+from datetime import date, datetime, timedelta
+from decimal import Decimal, ROUND_HALF_UP
 import os
+import re
+import time
+from pathlib import Path
+import hashlib
+import unicodedata
+from modelos import Transacao, Categoria, Meta, RegistroCategorias
+import diagnostico
 
-def criar_tabelas(page: ft.Page):
-    """Cria as tabelas necessárias no banco de dados"""
-    conn = sqlite3.connect("financeiro.db")
-    cursor = conn.cursor()
-    
-    # Tabela de transações
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS transacoes (
+# =============================================================================
+# GERENCIAMENTO DE CONEXÕES
+# =============================================================================
+
+DB_PATH = "financeiro.db"
+
+# PRAGMAs aplicados a cada conexão aberta
+PRAGMAS_CONEXAO = (
+    "PRAGMA journal_mode=WAL",
+    "PRAGMA synchronous=NORMAL",      # seguro com WAL, evita um fsync por commit
+    "PRAGMA cache_size=-8000",        # ~8 MB de cache de páginas
+    "PRAGMA mmap_size=67108864",      # 64 MB mapeados em memória
+    "PRAGMA temp_store=MEMORY",
+    "PRAGMA busy_timeout=5000",
+)
+
+# Quantidade de comandos preparados mantidos em cache por conexão
+STATEMENTS_EM_CACHE = 128
+
+_local = threading.local()
+_conexoes_abertas = []
+_conexoes_lock = threading.Lock()
+_geracao = 0
+# Segurada enquanto o arquivo do banco é trocado (restauração): ninguém abre
+# conexão nova nem grava configurações no arquivo antigo no meio da troca
+_arquivo_lock = threading.RLock()
+
+
+def _abrir_conexao():
+    """Abre uma nova conexão já configurada"""
+    # isolation_level=None: modo autocommit, as transações são abertas
+    # explicitamente por _transacao() quando há mais de um comando
+    conn = sqlite3.connect(
+        DB_PATH,
+        isolation_level=None,
+        check_same_thread=False,
+        cached_statements=STATEMENTS_EM_CACHE,
+    )
+    for pragma in PRAGMAS_CONEXAO:
+        conn.execute(pragma)
+    return conn
+
+
+def _conexao():
+    """Retorna a conexão da thread atual, abrindo-a se necessário"""
+    conn = getattr(_local, "conn", None)
+    if conn is None or _local.geracao != _geracao:
+        with _arquivo_lock:
+            conn = _abrir_conexao()
+            with _conexoes_lock:
+                _conexoes_abertas.append(conn)
+                _local.geracao = _geracao
+            _local.conn = conn
+    return conn
+
+
+@contextmanager
+def _transacao(conn=None, imediata=False):
+    """Executa um bloco de comandos numa única transação (um único commit)"""
+    conn = conn or _conexao()
+    conn.execute("BEGIN IMMEDIATE" if imediata else "BEGIN")
+    try:
+        yield conn
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+
+def fechar_conexoes():
+    """Fecha todas as conexões abertas (chamar antes de backup/restauração).
+
+    Ao fechar a última conexão o SQLite faz o checkpoint do WAL, deixando
+    todo o conteúdo no arquivo principal. As próximas chamadas reabrem
+    conexões novas automaticamente.
+    """
+    global _geracao
+    # Configurações ainda não gravadas vão para o arquivo antes de fechar
+    gravar_config_pendentes()
+    _invalidar_config()
+    _invalidar_registro_categorias()
+    with _conexoes_lock:
+        _geracao += 1
+        conexoes = list(_conexoes_abertas)
+        _conexoes_abertas.clear()
+    for conn in conexoes:
+        try:
+            # Atualiza as estatísticas do planejador quando necessário
+            conn.execute("PRAGMA optimize")
+            conn.close()
+        except sqlite3.Error as ex:
+            print(f"ERRO AO FECHAR CONEXÃO: {ex}")
+
+
+atexit.register(fechar_conexoes)
+
+# =============================================================================
+# ESQUEMA E MIGRAÇÕES
+# =============================================================================
+
+# Máximo de resultados devolvidos pela busca textual
+LIMITE_BUSCA = 200
+# Linhas por página do histórico (as páginas são fatias do mês já em memória)
+TAMANHO_PAGINA_HISTORICO = 50
+
+# Linhas convertidas por lote nas migrações de dados
+TAMANHO_LOTE_MIGRACAO = 5000
+
+CATEGORIAS_PADRAO = [
+    ("Salário", "Receita"),
+    ("Freelance", "Receita"),
+    ("Investimentos", "Receita"),
+    ("Retirada de Meta", "Receita"),
+    ("Outras Receitas", "Receita"),
+    ("Alimentação", "Despesa"),
+    ("Transporte", "Despesa"),
+    ("Lazer", "Despesa"),
+    ("Contas", "Despesa"),
+    ("Depósito em Meta", "Despesa"),
+    ("Outras Despesas", "Despesa"),
+]
+
+# Categoria usada na importação quando o extrato não informa uma
+CATEGORIA_PADRAO_IMPORTACAO = {"Receita": "Outras Receitas", "Despesa": "Outras Despesas"}
+
+# Linhas gravadas por transação (commit) na importação em massa
+TAMANHO_LOTE_IMPORTACAO = 2000
+
+# Quantas mensagens de erro de importação guardar para mostrar ao usuário
+MAX_ERROS_IMPORTACAO = 20
+
+
+def _data_iso(data):
+    """Converte date/datetime, 'dd/mm/YYYY' ou 'YYYY-MM-DD' para 'YYYY-MM-DD'"""
+    if isinstance(data, datetime):
+        return data.date().isoformat()
+    if isinstance(data, date):
+        return data.isoformat()
+    try:
+        return datetime.strptime(data, "%d/%m/%Y").date().isoformat()
+    except ValueError:
+        return date.fromisoformat(data).isoformat()
+
+
+def _centavos(valor):
+    """Converte um valor em reais (float, str ou Decimal) para centavos inteiros"""
+    centavos = Decimal(str(valor).replace(",", ".")) * 100
+    return int(centavos.to_integral_value(rounding=ROUND_HALF_UP))
+
+
+def _impressao_digital(tipo, descricao, centavos, data_iso):
+    """Impressão digital do conteúdo de uma transação: data, valor com sinal e descrição normalizada.
+
+    Duas transações com a mesma data, o mesmo valor e a mesma descrição (ignorando
+    maiúsculas, acentos e espaços) têm a mesma impressão.
+    """
+    texto = unicodedata.normalize("NFKD", descricao.lower())
+    texto = " ".join("".join(c for c in texto if not unicodedata.combining(c)).split())
+    valor = centavos if tipo == "Receita" else -centavos
+    chave = f"{data_iso}|{valor}|{texto}".encode("utf-8")
+    return hashlib.blake2b(chave, digest_size=8).hexdigest()
+
+
+def _migracao_001_esquema_inicial(conn):
+    """Esquema original do aplicativo (datas dd/mm/YYYY e valores REAL)"""
+    with _transacao(conn):
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS transacoes (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                tipo TEXT NOT NULL,
+                descricao TEXT NOT NULL,
+                valor REAL NOT NULL,
+                categoria TEXT NOT NULL,
+                data TEXT NOT NULL
+            )
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS categorias (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                nome TEXT NOT NULL UNIQUE,
+                tipo TEXT NOT NULL
+            )
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS metas (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                nome TEXT NOT NULL,
+                valor_objetivo REAL NOT NULL,
+                valor_atual REAL DEFAULT 0.0
+            )
+        """)
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS configuracoes (
+                chave TEXT PRIMARY KEY,
+                valor TEXT NOT NULL
+            )
+        """)
+        conn.execute("PRAGMA user_version = 1")
+
+
+def _migracao_002_datas_iso_centavos(conn):
+    """Reescreve transacoes com data ISO-8601 e valor em centavos inteiros.
+
+    As linhas são copiadas em lotes para uma tabela nova, cada lote na sua
+    própria transação. Se o processo for interrompido, a próxima execução
+    continua a partir do último id copiado. Linhas com data ou valor que não
+    dá para converter vão, como estavam, para transacoes_quarentena: uma data
+    inválida em transacoes quebraria toda leitura que a incluísse.
+    """
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS transacoes_migracao (
             id INTEGER PRIMARY KEY AUTOINCREMENT,
             tipo TEXT NOT NULL,
             descricao TEXT NOT NULL,
-            valor REAL NOT NULL,
+            valor_centavos INTEGER NOT NULL,
             categoria TEXT NOT NULL,
             data TEXT NOT NULL
         )
     """)
-    
-    # Tabela de categorias
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS categorias (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            nome TEXT NOT NULL UNIQUE,
-            tipo TEXT NOT NULL
-        )
-    """)
-    
-    # Tabela de metas
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS metas (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            nome TEXT NOT NULL,
-            valor_objetivo REAL NOT NULL,
-            valor_atual REAL DEFAULT 0.0
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS transacoes_quarentena (
+            id INTEGER PRIMARY KEY,
+            tipo TEXT,
+            descricao TEXT,
+            valor,
+            categoria TEXT,
+            data,
+            motivo TEXT NOT NULL
         )
     """)
-    
-    # Tabela de configurações
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS configuracoes (
-            chave TEXT PRIMARY KEY,
-            valor TEXT NOT NULL
-        )
+    ultimo_id = conn.execute(
+        "SELECT MAX(COALESCE((SELECT MAX(id) FROM transacoes_migracao), 0), "
+        "COALESCE((SELECT MAX(id) FROM transacoes_quarentena), 0))"
+    ).fetchone()[0]
+
+    while True:
+        lote = conn.execute(
+            "SELECT id, tipo, descricao, valor, categoria, data FROM transacoes "
+            "WHERE id > ? ORDER BY id LIMIT ?",
+            (ultimo_id, TAMANHO_LOTE_MIGRACAO)
+        ).fetchall()
+        if not lote:
+            break
+
+        convertidas = []
+        quarentena = []
+        for id_, tipo, descricao, valor, categoria, data in lote:
+            try:
+                convertidas.append((id_, tipo, descricao, _centavos(valor), categoria, _data_iso(data)))
+            except (TypeError, ValueError, ArithmeticError):
+                print(f"AVISO MIGRAÇÃO: transação {id_} com data '{data}' ou valor '{valor}' inválido, "
+                      f"movida para transacoes_quarentena.")
+                quarentena.append((id_, tipo, descricao, valor, categoria, data, "data ou valor inválido"))
+
+        with _transacao(conn):
+            conn.executemany(
+                "INSERT INTO transacoes_migracao (id, tipo, descricao, valor_centavos, categoria, data) "
+                "VALUES (?, ?, ?, ?, ?, ?)",
+                convertidas
+            )
+            conn.executemany(
+                "INSERT OR REPLACE INTO transacoes_quarentena (id, tipo, descricao, valor, categoria, data, motivo) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                quarentena
+            )
+        ultimo_id = lote[-1][0]
+
+    with _transacao(conn, imediata=True):
+        # Preserva o contador do AUTOINCREMENT (ids apagados não são reutilizados)
+        seq = conn.execute("SELECT seq FROM sqlite_sequence WHERE name = 'transacoes'").fetchone()
+        conn.execute("DROP TABLE transacoes")
+        conn.execute("ALTER TABLE transacoes_migracao RENAME TO transacoes")
+        if seq:
+            conn.execute(
+                "UPDATE sqlite_sequence SET seq = MAX(seq, ?) WHERE name = 'transacoes'", (seq[0],)
+            )
+        conn.execute("PRAGMA user_version = 2")
+
+
+def _migracao_003_indices(conn):
+    """Índices para os acessos reais do app: mês, tipo + período e categoria + período"""
+    with _transacao(conn):
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_transacoes_data ON transacoes (data)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_transacoes_tipo_data ON transacoes (tipo, data)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_transacoes_categoria_data ON transacoes (categoria, data)")
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_categorias_tipo_nome ON categorias (tipo, nome)")
+        conn.execute("PRAGMA user_version = 3")
+    conn.execute("ANALYZE")
+
+
+# Ano e mês de uma data ISO, usados pelas triggers e pela reconstrução do resumo
+_ANO_SQL = "CAST(substr({0}, 1, 4) AS INTEGER)"
+_MES_SQL = "CAST(substr({0}, 6, 2) AS INTEGER)"
+
+
+def _sql_somar_resumo(linha):
+    return f"""
+        INSERT INTO resumo_mensal (ano, mes, tipo, categoria, total_centavos, quantidade)
+        VALUES ({_ANO_SQL.format(linha + '.data')}, {_MES_SQL.format(linha + '.data')},
+                {linha}.tipo, {linha}.categoria, {linha}.valor_centavos, 1)
+        ON CONFLICT (ano, mes, tipo, categoria) DO UPDATE SET
+            total_centavos = total_centavos + excluded.total_centavos,
+            quantidade = quantidade + 1;
+    """
+
+
+def _sql_subtrair_resumo(linha):
+    chave = (
+        f"ano = {_ANO_SQL.format(linha + '.data')} AND mes = {_MES_SQL.format(linha + '.data')} "
+        f"AND tipo = {linha}.tipo AND categoria = {linha}.categoria"
+    )
+    return f"""
+        UPDATE resumo_mensal
+        SET total_centavos = total_centavos - {linha}.valor_centavos, quantidade = quantidade - 1
+        WHERE {chave};
+        DELETE FROM resumo_mensal WHERE {chave} AND quantidade <= 0;
+    """
+
+
+def _migracao_004_resumo_mensal(conn):
+    """Tabela resumo_mensal (totais por mês/tipo/categoria) mantida por triggers"""
+    with _transacao(conn):
+        conn.execute("""
+            CREATE TABLE IF NOT EXISTS resumo_mensal (
+                ano INTEGER NOT NULL,
+                mes INTEGER NOT NULL,
+                tipo TEXT NOT NULL,
+                categoria TEXT NOT NULL,
+                total_centavos INTEGER NOT NULL,
+                quantidade INTEGER NOT NULL,
+                PRIMARY KEY (ano, mes, tipo, categoria)
+            ) WITHOUT ROWID
+        """)
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_resumo_mensal_insert AFTER INSERT ON transacoes
+            BEGIN {_sql_somar_resumo("NEW")} END
+        """)
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_resumo_mensal_delete AFTER DELETE ON transacoes
+            BEGIN {_sql_subtrair_resumo("OLD")} END
+        """)
+        conn.execute(f"""
+            CREATE TRIGGER IF NOT EXISTS trg_resumo_mensal_update
+            AFTER UPDATE OF tipo, categoria, valor_centavos, data ON transacoes
+            BEGIN {_sql_subtrair_resumo("OLD")} {_sql_somar_resumo("NEW")} END
+        """)
+        _reconstruir_resumo_mensal(conn)
+        conn.execute("PRAGMA user_version = 4")
+
+
+def _reconstruir_resumo_mensal(conn):
+    conn.execute("DELETE FROM resumo_mensal")
+    conn.execute(f"""
+        INSERT INTO resumo_mensal (ano, mes, tipo, categoria, total_centavos, quantidade)
+        SELECT {_ANO_SQL.format("data")}, {_MES_SQL.format("data")}, tipo, categoria,
+               SUM(valor_centavos), COUNT(*)
+        FROM transacoes
+        GROUP BY 1, 2, 3, 4
     """)
-    
-    # Inserir categorias padrão
-    categorias_padrao = [
-        ("Salário", "Receita"),
-        ("Freelance", "Receita"),
-        ("Investimentos", "Receita"),
-        ("Retirada de Meta", "Receita"),
-        ("Alimentação", "Despesa"),
-        ("Transporte", "Despesa"),
-        ("Lazer", "Despesa"),
-        ("Contas", "Despesa"),
-        ("Depósito em Meta", "Despesa"),
-    ]
-    
-    for nome, tipo in categorias_padrao:
-        cursor.execute("INSERT OR IGNORE INTO categorias (nome, tipo) VALUES (?, ?)", (nome, tipo))
-    
-    conn.commit()
-    conn.close()
 
-def adicionar_transacao_db(page: ft.Page, tipo, descricao, valor, categoria, data):
-    """Adiciona uma nova transação ao banco de dados"""
-    conn = sqlite3.connect("financeiro.db")
-    cursor = conn.cursor()
-    cursor.execute(
-        "INSERT INTO transacoes (tipo, descricao, valor, categoria, data) VALUES (?, ?, ?, ?, ?)",
-        (tipo, descricao, valor, categoria, data)
+
+def reconstruir_resumo_mensal_db(page: ft.Page):
+    """Recalcula resumo_mensal a partir de transacoes (bancos antigos ou após correções manuais)"""
+    with _transacao(imediata=True) as conn:
+        _reconstruir_resumo_mensal(conn)
+
+
+def _migracao_005_busca_texto(conn):
+    """Índice FTS5 sobre descricao e categoria, sem acentos e com prefixos de 2 e 3 letras"""
+    with _transacao(conn):
+        try:
+            conn.execute("""
+                CREATE VIRTUAL TABLE IF NOT EXISTS transacoes_fts USING fts5(
+                    descricao, categoria,
+                    content='transacoes', content_rowid='id',
+                    tokenize='unicode61 remove_diacritics 2',
+                    prefix='2 3'
+                )
+            """)
+        except sqlite3.OperationalError as ex:
+            # SQLite sem FTS5: a busca continua funcionando com LIKE
+            print(f"AVISO MIGRAÇÃO: FTS5 indisponível ({ex}), busca usará LIKE.")
+        else:
+            conn.execute("""
+                CREATE TRIGGER IF NOT EXISTS trg_transacoes_fts_insert AFTER INSERT ON transacoes
+                BEGIN
+                    INSERT INTO transacoes_fts (rowid, descricao, categoria)
+                    VALUES (NEW.id, NEW.descricao, NEW.categoria);
+                END
+            """)
+            conn.execute("""
+                CREATE TRIGGER IF NOT EXISTS trg_transacoes_fts_delete AFTER DELETE ON transacoes
+                BEGIN
+                    INSERT INTO transacoes_fts (transacoes_fts, rowid, descricao, categoria)
+                    VALUES ('delete', OLD.id, OLD.descricao, OLD.categoria);
+                END
+            """)
+            conn.execute("""
+                CREATE TRIGGER IF NOT EXISTS trg_transacoes_fts_update
+                AFTER UPDATE OF descricao, categoria ON transacoes
+                BEGIN
+                    INSERT INTO transacoes_fts (transacoes_fts, rowid, descricao, categoria)
+                    VALUES ('delete', OLD.id, OLD.descricao, OLD.categoria);
+                    INSERT INTO transacoes_fts (rowid, descricao, categoria)
+                    VALUES (NEW.id, NEW.descricao, NEW.categoria);
+                END
+            """)
+            conn.execute("INSERT INTO transacoes_fts (transacoes_fts) VALUES ('rebuild')")
+        conn.execute("PRAGMA user_version = 5")
+
+
+def _migracao_006_impressao_digital(conn):
+    """Coluna impressao (detecção de duplicatas) preenchida em lotes, com índice de busca"""
+    colunas = [linha[1] for linha in conn.execute("PRAGMA table_info(transacoes)")]
+    if "impressao" not in colunas:
+        conn.execute("ALTER TABLE transacoes ADD COLUMN impressao TEXT")
+
+    ultimo_id = 0
+    while True:
+        lote = conn.execute(
+            "SELECT id, tipo, descricao, valor_centavos, data FROM transacoes "
+            "WHERE id > ? AND impressao IS NULL ORDER BY id LIMIT ?",
+            (ultimo_id, TAMANHO_LOTE_MIGRACAO)
+        ).fetchall()
+        if not lote:
+            break
+        with _transacao(conn):
+            conn.executemany(
+                "UPDATE transacoes SET impressao = ? WHERE id = ?",
+                [(_impressao_digital(tipo, descricao, centavos, data), id_)
+                 for id_, tipo, descricao, centavos, data in lote]
+            )
+        ultimo_id = lote[-1][0]
+
+    with _transacao(conn):
+        conn.execute("CREATE INDEX IF NOT EXISTS idx_transacoes_impressao ON transacoes (impressao)")
+        conn.execute("PRAGMA user_version = 6")
+
+
+# Cada posição corresponde a uma versão do esquema (PRAGMA user_version)
+MIGRACOES = [
+    _migracao_001_esquema_inicial,
+    _migracao_002_datas_iso_centavos,
+    _migracao_003_indices,
+    _migracao_004_resumo_mensal,
+    _migracao_005_busca_texto,
+    _migracao_006_impressao_digital,
+]
+
+
+def _migrar(conn):
+    """Aplica, em ordem, as migrações ainda não aplicadas ao banco"""
+    versao_atual = conn.execute("PRAGMA user_version").fetchone()[0]
+    for versao, migracao in enumerate(MIGRACOES, start=1):
+        if versao > versao_atual:
+            migracao(conn)
+            print(f"MIGRAÇÃO: banco atualizado para a versão {versao}.")
+
+
+def _preparar_banco(conn):
+    """Aplica as migrações pendentes e garante as categorias padrão"""
+    _migrar(conn)
+    with _transacao(conn):
+        conn.executemany("INSERT OR IGNORE INTO categorias (nome, tipo) VALUES (?, ?)", CATEGORIAS_PADRAO)
+
+
+def criar_tabelas(page: ft.Page):
+    """Cria as tabelas e aplica as migrações pendentes do banco de dados"""
+    _preparar_banco(_conexao())
+    _invalidar_registro_categorias()
+
+# =============================================================================
+# CONSULTAS REGISTRADAS
+# =============================================================================
+
+# nome -> (sql, varredura_permitida); verificado por verificar_planos_consulta_db
+CONSULTAS = {}
+
+
+def _consulta(nome, sql, varredura_permitida=False):
+    """Registra uma consulta para a verificação de planos e devolve o SQL"""
+    CONSULTAS[nome] = (sql, varredura_permitida)
+    return sql
+
+
+_SQL_TRANSACOES_TODAS = _consulta(
+    "transacoes_todas",
+    "SELECT id, tipo, descricao, valor_centavos, categoria, data FROM transacoes "
+    "ORDER BY data DESC, id DESC",
+    varredura_permitida=True,  # lista o histórico inteiro, em ordem de índice
+)
+_SQL_TRANSACOES_BUSCA = _consulta(
+    "transacoes_busca",
+    "SELECT id, tipo, descricao, valor_centavos, categoria, data FROM transacoes "
+    "WHERE descricao LIKE ? ORDER BY data DESC, id DESC",
+    varredura_permitida=True,  # LIKE '%termo%' não pode usar índice (só sem FTS5)
+)
+
+def _sql_transacoes_periodo(tipo, categoria, busca):
+    filtros = ["data BETWEEN ? AND ?"]
+    if tipo:
+        filtros.append("tipo = ?")
+    if categoria:
+        filtros.append("categoria = ?")
+    if busca:
+        filtros.append("descricao LIKE ?")
+    return (
+        "SELECT id, tipo, descricao, valor_centavos, categoria, data FROM transacoes "
+        f"WHERE {' AND '.join(filtros)} ORDER BY data DESC, id DESC"
+    )
+
+
+# Uma variante por combinação de filtros, todas registradas para a verificação de planos
+_SQL_TRANSACOES_PERIODO = {
+    (tipo, categoria, busca): _consulta(
+        "transacoes_periodo"
+        + ("_tipo" if tipo else "")
+        + ("_categoria" if categoria else "")
+        + ("_busca" if busca else ""),
+        _sql_transacoes_periodo(tipo, categoria, busca),
+    )
+    for tipo, categoria, busca in itertools.product((False, True), repeat=3)
+}
+_SQL_RESUMO_MESES = _consulta(
+    "resumo_meses",
+    "SELECT tipo, categoria, SUM(total_centavos), SUM(quantidade) FROM resumo_mensal "
+    "WHERE (ano, mes) BETWEEN (?, ?) AND (?, ?) GROUP BY tipo, categoria",
+)
+_SQL_TOTAIS_CATEGORIAS_PARCIAL = _consulta(
+    "totais_categorias_parcial",
+    "SELECT tipo, categoria, SUM(valor_centavos), COUNT(*) FROM transacoes "
+    "WHERE data BETWEEN ? AND ? GROUP BY tipo, categoria",
+)
+_SQL_ESTATISTICAS_CATEGORIAS = _consulta(
+    "estatisticas_categorias",
+    "SELECT tipo, categoria, SUM(valor_centavos), COUNT(*), MIN(valor_centavos), MAX(valor_centavos) "
+    "FROM transacoes WHERE data BETWEEN ? AND ? GROUP BY tipo, categoria",
+)
+_SQL_ESTATISTICAS_CATEGORIAS_TIPO = _consulta(
+    "estatisticas_categorias_tipo",
+    "SELECT tipo, categoria, SUM(valor_centavos), COUNT(*), MIN(valor_centavos), MAX(valor_centavos) "
+    "FROM transacoes WHERE tipo = ? AND data BETWEEN ? AND ? GROUP BY tipo, categoria",
+)
+
+def _sql_transacoes_texto(periodo, tipo, categoria):
+    filtros = ["transacoes_fts MATCH ?"]
+    if periodo:
+        filtros.append("t.data BETWEEN ? AND ?")
+    if tipo:
+        filtros.append("t.tipo = ?")
+    if categoria:
+        filtros.append("t.categoria = ?")
+    return (
+        "SELECT t.id, t.tipo, t.descricao, t.valor_centavos, t.categoria, t.data "
+        "FROM transacoes_fts JOIN transacoes t ON t.id = transacoes_fts.rowid "
+        f"WHERE {' AND '.join(filtros)} ORDER BY rank LIMIT ?"
+    )
+
+
+_SQL_TRANSACOES_TEXTO = {
+    (periodo, tipo, categoria): _consulta(
+        "transacoes_texto"
+        + ("_periodo" if periodo else "")
+        + ("_tipo" if tipo else "")
+        + ("_categoria" if categoria else ""),
+        _sql_transacoes_texto(periodo, tipo, categoria),
     )
-    conn.commit()
-    conn.close()
+    for periodo, tipo, categoria in itertools.product((False, True), repeat=3)
+}
+_SQL_TRANSACAO_INSERIR = (
+    "INSERT INTO transacoes (tipo, descricao, valor_centavos, categoria, data, impressao) "
+    "VALUES (?, ?, ?, ?, ?, ?)"
+)
+_SQL_TRANSACAO_ATUALIZAR = _consulta(
+    "transacao_atualizar",
+    "UPDATE transacoes SET tipo=?, descricao=?, valor_centavos=?, categoria=?, data=?, impressao=? WHERE id=?",
+)
+_SQL_DUPLICATAS_CONTAR = _consulta(
+    "duplicatas_contar", "SELECT COUNT(*) FROM transacoes WHERE impressao = ?"
+)
+# Impressões conferidas por consulta na importação (o que faltar é completado com NULL)
+IMPRESSOES_POR_CONSULTA = 500
+_SQL_DUPLICATAS_CONTAR_VARIAS = _consulta(
+    "duplicatas_contar_varias",
+    "SELECT impressao, COUNT(*) FROM transacoes "
+    f"WHERE impressao IN ({', '.join('?' * IMPRESSOES_POR_CONSULTA)}) AND id <= ? GROUP BY impressao",
+)
+_SQL_TRANSACAO_ULTIMO_ID = _consulta("transacao_ultimo_id", "SELECT COALESCE(MAX(id), 0) FROM transacoes")
+_SQL_TRANSACAO_DELETAR = _consulta("transacao_deletar", "DELETE FROM transacoes WHERE id=?")
+_SQL_TRANSACAO_LER = _consulta(
+    "transacao_ler", "SELECT id, tipo, descricao, valor_centavos, categoria, data FROM transacoes WHERE id=?"
+)
+_SQL_CATEGORIAS_TODAS = _consulta(
+    "categorias_todas",
+    "SELECT id, nome, tipo FROM categorias ORDER BY nome",
+    varredura_permitida=True,  # lista todas as categorias
+)
+_SQL_CATEGORIA_DELETAR = _consulta("categoria_deletar", "DELETE FROM categorias WHERE id=?")
+_SQL_METAS_TODAS = _consulta(
+    "metas_todas",
+    "SELECT id, nome, valor_objetivo, valor_atual FROM metas ORDER BY nome",
+    varredura_permitida=True,  # poucas linhas, sempre listadas por inteiro
+)
+_SQL_META_ATUALIZAR_VALOR = _consulta("meta_atualizar_valor", "UPDATE metas SET valor_atual=? WHERE id=?")
+_SQL_META_LER = _consulta("meta_ler", "SELECT id, nome, valor_objetivo, valor_atual FROM metas WHERE id=?")
+_SQL_META_DELETAR = _consulta("meta_deletar", "DELETE FROM metas WHERE id=?")
+_SQL_CONFIG_TODAS = _consulta(
+    "config_todas",
+    "SELECT chave, valor FROM configuracoes",
+    varredura_permitida=True,  # poucas linhas, carregadas uma vez para o cache
+)
+_SQL_CONFIG_GRAVAR = "INSERT OR REPLACE INTO configuracoes (chave, valor) VALUES (?, ?)"
+
+
+_RE_FTS_MATCH = re.compile(r"VIRTUAL TABLE INDEX \d+:\S*M")
+
+
+def verificar_planos_consulta_db(page: ft.Page):
+    """Roda EXPLAIN QUERY PLAN nas consultas registradas e retorna as que fazem varredura completa"""
+    conn = _conexao()
+    problemas = []
+    for nome, (sql, varredura_permitida) in CONSULTAS.items():
+        if varredura_permitida:
+            continue
+        parametros = (None,) * sql.count("?")
+        for _id, _pai, _nao_usado, detalhe in conn.execute("EXPLAIN QUERY PLAN " + sql, parametros):
+            # "SCAN tabela" (com ou sem índice) percorre a tabela/índice inteiro;
+            # o esperado é "SEARCH tabela USING ...". Na tabela FTS5 o plano
+            # sempre diz SCAN, mas com MATCH ("INDEX n:M...") é uma busca no índice.
+            if detalhe.startswith("SCAN") and not _RE_FTS_MATCH.search(detalhe):
+                problemas.append((nome, detalhe))
+    return problemas
+
+# =============================================================================
+# TRANSAÇÕES, CATEGORIAS, METAS E CONFIGURAÇÕES
+# =============================================================================
+
+def _linha_para_transacao(cursor, row):
+    """row_factory: monta a Transacao já com a data convertida para date"""
+    return Transacao(row[0], row[1], row[2], row[3], row[4], date.fromisoformat(row[5]))
+
+def _linha_para_categoria(cursor, row):
+    return Categoria(*row)
+
+def _linha_para_meta(cursor, row):
+    return Meta(*row)
+
+def _tem_busca_texto():
+    """Indica se o banco tem o índice FTS5 (pode faltar em SQLite compilado sem FTS5)"""
+    return _conexao().execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'transacoes_fts'"
+    ).fetchone() is not None
+
+def _consulta_fts(termo):
+    """Converte o texto digitado numa consulta FTS5: cada palavra vira um prefixo ("merc"*)"""
+    palavras = re.findall(r"\w+", termo or "")
+    return " ".join(f'"{palavra}"*' for palavra in palavras)
+
+def _palavras_fts(texto):
+    """Palavras do texto como o tokenizador unicode61 do índice as vê: minúsculas e sem acentos"""
+    texto = unicodedata.normalize("NFKD", texto.lower())
+    return re.findall(r"[^\W_]+", "".join(c for c in texto if not unicodedata.combining(c)))
+
+def filtrar_busca(transacoes, termo):
+    """Aplica em memória a mesma regra da busca textual do banco (cada palavra de termo é
+    prefixo de uma palavra da descrição ou da categoria), preservando a ordem.
+
+    Retorna None quando a regra não pode ser reproduzida fora do SQLite (banco sem
+    FTS5, que busca com LIKE, ou palavras que o FTS5 trataria como frase, ex.: "a_b").
+    """
+    palavras = re.findall(r"\w+", termo or "")
+    prefixos = _palavras_fts(" ".join(palavras))
+    if not palavras or len(prefixos) != len(palavras) or not _tem_busca_texto():
+        return None
+    resultado = []
+    for t in transacoes:
+        palavras_transacao = _palavras_fts(f"{t.descricao} {t.categoria}")
+        if all(any(p.startswith(prefixo) for p in palavras_transacao) for prefixo in prefixos):
+            resultado.append(t)
+    return resultado
+
+def limites_mes(ano, mes):
+    """Primeiro e último dia do mês"""
+    return date(ano, mes, 1), date(ano, mes, monthrange(ano, mes)[1])
+
+
+def _linha_para_gravar(tipo, descricao, valor, categoria, data):
+    """Tupla (tipo, descricao, centavos, categoria, data ISO, impressao) pronta para o INSERT"""
+    centavos = _centavos(valor)
+    data_iso = _data_iso(data)
+    return (tipo, descricao, centavos, categoria, data_iso, _impressao_digital(tipo, descricao, centavos, data_iso))
+
+def adicionar_transacao_db(page: ft.Page, tipo, descricao, valor, categoria, data, ignorar_duplicada=False):
+    """Adiciona uma nova transação ao banco de dados (valor em reais, data dd/mm/YYYY ou date).
+
+    Retorna o id da transação criada. Com ignorar_duplicada=True, não grava
+    (e retorna None) se já existir uma transação igual; a conferência e a
+    gravação ficam numa só transação BEGIN IMMEDIATE.
+    """
+    linha = _linha_para_gravar(tipo, descricao, valor, categoria, data)
+    conn = _conexao()
+    if not ignorar_duplicada:
+        return conn.execute(_SQL_TRANSACAO_INSERIR, linha).lastrowid
+    with _transacao(conn, imediata=True):
+        if conn.execute(_SQL_DUPLICATAS_CONTAR, (linha[-1],)).fetchone()[0]:
+            return None
+        return conn.execute(_SQL_TRANSACAO_INSERIR, linha).lastrowid
+
+def existe_duplicata_db(page: ft.Page, tipo, descricao, valor, data):
+    """Indica se já existe uma transação com a mesma data, valor e descrição (busca no índice)"""
+    centavos = _centavos(valor)
+    data_iso = _data_iso(data)
+    impressao = _impressao_digital(tipo, descricao, centavos, data_iso)
+    return _conexao().execute(_SQL_DUPLICATAS_CONTAR, (impressao,)).fetchone()[0] > 0
+
+def _contar_impressoes(conn, impressoes, ultimo_id):
+    """impressao -> quantas transações com id <= ultimo_id a têm (só as presentes no banco)"""
+    impressoes = list(impressoes)
+    contagem = {}
+    for inicio in range(0, len(impressoes), IMPRESSOES_POR_CONSULTA):
+        parte = impressoes[inicio:inicio + IMPRESSOES_POR_CONSULTA]
+        parte += [None] * (IMPRESSOES_POR_CONSULTA - len(parte))
+        contagem.update(conn.execute(_SQL_DUPLICATAS_CONTAR_VARIAS, parte + [ultimo_id]))
+    return contagem
+
+def adicionar_transacoes_lote_db(page: ft.Page, transacoes, tamanho_lote=TAMANHO_LOTE_IMPORTACAO, ao_progresso=None,
+                                 ignorar_duplicadas=True):
+    """Insere muitas transações com executemany, um commit por lote.
+
+    Cada item é um dict com tipo, descricao, valor (reais), data e, opcionalmente,
+    categoria. Sem categoria, usa CATEGORIA_PADRAO_IMPORTACAO; categorias que não
+    existem ou são de outro tipo fazem a linha ser rejeitada. O iterável é
+    consumido aos poucos, então pode vir direto de um leitor de arquivo.
+
+    Com ignorar_duplicadas, linhas que já existem no banco são puladas (ao
+    reimportar um extrato que se sobrepõe ao anterior). Cada lote consulta só
+    as próprias impressões, entre as linhas que já estavam no banco antes da
+    importação, e a memória não cresce com o arquivo. A comparação é por
+    quantidade dentro do lote: se o banco tem duas transações iguais e o lote
+    três, só a terceira é gravada.
+    """
+    conn = _conexao()
+    tipo_da_categoria = registro_categorias_db(page).tipo_por_nome
+    resultado = {"importadas": 0, "rejeitadas": 0, "duplicadas": 0, "erros": []}
+    # Linhas gravadas pelos lotes anteriores (id maior) não contam como já existentes
+    ultimo_id = conn.execute(_SQL_TRANSACAO_ULTIMO_ID).fetchone()[0]
+
+    iterador = iter(transacoes)
+    while True:
+        lote = list(itertools.islice(iterador, tamanho_lote))
+        if not lote:
+            break
+
+        linhas = []
+        for t in lote:
+            categoria = t.get("categoria") or CATEGORIA_PADRAO_IMPORTACAO.get(t["tipo"])
+            if tipo_da_categoria.get(categoria) != t["tipo"]:
+                resultado["rejeitadas"] += 1
+                if len(resultado["erros"]) < MAX_ERROS_IMPORTACAO:
+                    resultado["erros"].append(f"'{t['descricao']}': categoria '{categoria}' inválida para {t['tipo']}")
+                continue
+            linhas.append(_linha_para_gravar(t["tipo"], t["descricao"], t["valor"], categoria, t["data"]))
+
+        if ignorar_duplicadas and linhas:
+            # impressao -> quantas cópias do banco ainda podem "absorver" linhas deste lote
+            existentes = _contar_impressoes(conn, {linha[-1] for linha in linhas}, ultimo_id)
+            novas = []
+            for linha in linhas:
+                if existentes.get(linha[-1], 0) > 0:
+                    existentes[linha[-1]] -= 1
+                    resultado["duplicadas"] += 1
+                else:
+                    novas.append(linha)
+            linhas = novas
+
+        if linhas:
+            with _transacao(conn):
+                conn.executemany(_SQL_TRANSACAO_INSERIR, linhas)
+            resultado["importadas"] += len(linhas)
+        if ao_progresso:
+            ao_progresso(resultado)
+
+    return resultado
 
 def buscar_transacoes_db(page: ft.Page, termo_busca=None):
     """Busca todas as transações ou filtra por termo de busca"""
-    # ADICIONE A LINHA ABAIXO
-    print(f"DEBUG DB: Buscando em '{os.path.abspath('financeiro.db')}'")
+    if termo_busca and _tem_busca_texto():
+        return buscar_transacoes_texto_db(page, termo_busca)
 
-    conn = sqlite3.connect("financeiro.db")
-    cursor = conn.cursor()
+    cursor = _conexao().cursor()
+    cursor.row_factory = _linha_para_transacao
     
     if termo_busca:
-        cursor.execute(
-            "SELECT * FROM transacoes WHERE descricao LIKE ? ORDER BY data DESC",
-            (f"%{termo_busca}%",)
-        )
+        cursor.execute(_SQL_TRANSACOES_BUSCA, (f"%{termo_busca}%",))
     else:
-        cursor.execute("SELECT * FROM transacoes ORDER BY data DESC")
+        cursor.execute(_SQL_TRANSACOES_TODAS)
     
-    transacoes = []
-    for row in cursor.fetchall():
-        transacoes.append({
-            "id": row[0],
-            "tipo": row[1],
-            "descricao": row[2],
-            "valor": row[3],
-            "categoria": row[4],
-            "data": row[5]
+    return cursor.fetchall()
+
+def buscar_transacoes_periodo_db(page: ft.Page, inicio, fim, tipo=None, categoria=None, termo_busca=None):
+    """Busca as transações entre inicio e fim (inclusive), com filtros opcionais de tipo, categoria e descrição"""
+    if termo_busca and _tem_busca_texto():
+        return buscar_transacoes_texto_db(page, termo_busca, inicio, fim, tipo, categoria)
+
+    parametros = [_data_iso(inicio), _data_iso(fim)]
+    if tipo:
+        parametros.append(tipo)
+    if categoria:
+        parametros.append(categoria)
+    if termo_busca:
+        parametros.append(f"%{termo_busca}%")
+
+    sql = _SQL_TRANSACOES_PERIODO[(bool(tipo), bool(categoria), bool(termo_busca))]
+    cursor = _conexao().cursor()
+    cursor.row_factory = _linha_para_transacao
+    cursor.execute(sql, parametros)
+    return cursor.fetchall()
+
+def buscar_transacoes_texto_db(page: ft.Page, termo, inicio=None, fim=None, tipo=None, categoria=None,
+                               limite=LIMITE_BUSCA):
+    """Busca textual (FTS5) em descrição e categoria, por prefixo e sem acentos, ordenada por relevância"""
+    consulta = _consulta_fts(termo)
+    if not consulta:
+        return []
+
+    periodo = inicio is not None and fim is not None
+    parametros = [consulta]
+    if periodo:
+        parametros += [_data_iso(inicio), _data_iso(fim)]
+    if tipo:
+        parametros.append(tipo)
+    if categoria:
+        parametros.append(categoria)
+    parametros.append(limite)
+
+    sql = _SQL_TRANSACOES_TEXTO[(periodo, bool(tipo), bool(categoria))]
+    cursor = _conexao().cursor()
+    cursor.row_factory = _linha_para_transacao
+    cursor.execute(sql, parametros)
+    return cursor.fetchall()
+
+def buscar_transacoes_mes_db(page: ft.Page, ano, mes, tipo=None, categoria=None, termo_busca=None):
+    """Busca as transações de um mês, com os mesmos filtros de buscar_transacoes_periodo_db"""
+    inicio, fim = limites_mes(ano, mes)
+    return buscar_transacoes_periodo_db(page, inicio, fim, tipo, categoria, termo_busca)
+
+def _dividir_periodo(inicio, fim):
+    """Separa [inicio, fim] em meses completos e nas pontas parciais que sobram.
+
+    Retorna ((ano, mes) inicial, (ano, mes) final) dos meses completos, ou
+    None se não houver nenhum, e a lista de intervalos de datas parciais.
+    """
+    # Índice de mês: ano * 12 + (mes - 1)
+    primeiro = inicio.year * 12 + inicio.month - 1 + (0 if inicio.day == 1 else 1)
+    ultimo_dia_fim = monthrange(fim.year, fim.month)[1]
+    ultimo = fim.year * 12 + fim.month - 1 - (0 if fim.day == ultimo_dia_fim else 1)
+
+    if primeiro > ultimo:
+        return None, [(inicio, fim)]
+
+    meses = (divmod(primeiro, 12), divmod(ultimo, 12))
+    meses = tuple((ano, mes + 1) for ano, mes in meses)
+    pontas = []
+    if inicio.day != 1:
+        pontas.append((inicio, date(*meses[0], 1) - timedelta(days=1)))
+    if fim.day != ultimo_dia_fim:
+        pontas.append((limites_mes(*meses[1])[1] + timedelta(days=1), fim))
+    return meses, pontas
+
+
+def _somar_periodo(inicio, fim):
+    """{(tipo, categoria): [centavos, quantidade]} do período.
+
+    Meses completos são lidos de resumo_mensal (custo proporcional ao número
+    de categorias); só as pontas parciais consultam transacoes.
+    """
+    inicio = date.fromisoformat(_data_iso(inicio))
+    fim = date.fromisoformat(_data_iso(fim))
+    somas = {}
+    if inicio > fim:
+        return somas
+
+    cursor = _conexao().cursor()
+    meses, pontas = _dividir_periodo(inicio, fim)
+    linhas = []
+    if meses:
+        linhas += cursor.execute(_SQL_RESUMO_MESES, (*meses[0], *meses[1])).fetchall()
+    for ponta_inicio, ponta_fim in pontas:
+        linhas += cursor.execute(
+            _SQL_TOTAIS_CATEGORIAS_PARCIAL, (ponta_inicio.isoformat(), ponta_fim.isoformat())
+        ).fetchall()
+
+    for tipo, categoria, centavos, quantidade in linhas:
+        soma = somas.setdefault((tipo, categoria), [0, 0])
+        soma[0] += centavos
+        soma[1] += quantidade
+    return somas
+
+def totais_por_tipo_db(page: ft.Page, inicio, fim, categoria=None):
+    """Soma das receitas e das despesas no período (em reais)"""
+    centavos = {"Receita": 0, "Despesa": 0}
+    for (tipo, categoria_), (total, _quantidade) in _somar_periodo(inicio, fim).items():
+        if categoria is None or categoria_ == categoria:
+            centavos[tipo] = centavos.get(tipo, 0) + total
+    return {tipo: total / 100 for tipo, total in centavos.items()}
+
+def totais_por_categoria_db(page: ft.Page, inicio, fim, tipo=None):
+    """Total e quantidade de transações por categoria no período, ordenados por tipo e categoria"""
+    return [
+        {"tipo": tipo_, "categoria": categoria, "total": total / 100, "quantidade": quantidade}
+        for (tipo_, categoria), (total, quantidade) in sorted(_somar_periodo(inicio, fim).items())
+        if tipo is None or tipo_ == tipo
+    ]
+
+def estatisticas_por_categoria_db(page: ft.Page, inicio, fim, tipo=None):
+    """Total, quantidade, mínimo, máximo e média por categoria no período, num único GROUP BY.
+
+    Lê as linhas de transacoes; quando só os totais interessam, totais_por_categoria_db é mais barato.
+    """
+    cursor = _conexao().cursor()
+    if tipo:
+        cursor.execute(_SQL_ESTATISTICAS_CATEGORIAS_TIPO, (tipo, _data_iso(inicio), _data_iso(fim)))
+    else:
+        cursor.execute(_SQL_ESTATISTICAS_CATEGORIAS, (_data_iso(inicio), _data_iso(fim)))
+
+    estatisticas = []
+    for tipo_, categoria, total, quantidade, minimo, maximo in cursor.fetchall():
+        estatisticas.append({
+            "tipo": tipo_,
+            "categoria": categoria,
+            "total": total / 100,
+            "quantidade": quantidade,
+            "minimo": minimo / 100,
+            "maximo": maximo / 100,
+            "media": total / quantidade / 100,
         })
-    
-    conn.close()
-    return transacoes
+    return estatisticas
 
 def update_transacao_db(page: ft.Page, id, tipo, descricao, valor, categoria, data):
     """Atualiza uma transação existente"""
-    conn = sqlite3.connect("financeiro.db")
-    cursor = conn.cursor()
+    cursor = _conexao().cursor()
     cursor.execute(
-        "UPDATE transacoes SET tipo=?, descricao=?, valor=?, categoria=?, data=? WHERE id=?",
-        (tipo, descricao, valor, categoria, data, id)
+        _SQL_TRANSACAO_ATUALIZAR,
+        (*_linha_para_gravar(tipo, descricao, valor, categoria, data), id)
     )
-    conn.commit()
-    conn.close()
+
+def buscar_transacao_db(page: ft.Page, id):
+    """Busca uma transação pelo id (None se não existir)"""
+    cursor = _conexao().cursor()
+    cursor.row_factory = _linha_para_transacao
+    return cursor.execute(_SQL_TRANSACAO_LER, (id,)).fetchone()
 
 def deletar_transacao_db(page: ft.Page, id):
     """Remove uma transação do banco de dados"""
-    conn = sqlite3.connect("financeiro.db")
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM transacoes WHERE id=?", (id,))
-    conn.commit()
-    conn.close()
+    cursor = _conexao().cursor()
+    cursor.execute(_SQL_TRANSACAO_DELETAR, (id,))
 
 def buscar_categorias_db(page: ft.Page, tipo=None):
-    """Busca categorias, opcionalmente filtradas por tipo"""
-    conn = sqlite3.connect("financeiro.db")
-    cursor = conn.cursor()
-    
+    """Busca categorias, opcionalmente filtradas por tipo (do registro em memória)"""
+    categorias = registro_categorias_db(page).categorias
     if tipo:
-        cursor.execute("SELECT * FROM categorias WHERE tipo=? ORDER BY nome", (tipo,))
-    else:
-        cursor.execute("SELECT * FROM categorias ORDER BY nome")
-    
-    categorias = []
-    for row in cursor.fetchall():
-        categorias.append({
-            "id": row[0],
-            "nome": row[1],
-            "tipo": row[2]
-        })
-    
-    conn.close()
-    return categorias
+        return [cat for cat in categorias if cat.tipo == tipo]
+    return list(categorias)
 
 def adicionar_categoria_db(page: ft.Page, nome, tipo):
     """Adiciona uma nova categoria"""
-    conn = sqlite3.connect("financeiro.db")
-    cursor = conn.cursor()
-    cursor.execute("INSERT INTO categorias (nome, tipo) VALUES (?, ?)", (nome, tipo))
-    conn.commit()
-    conn.close()
+    cursor = _conexao().cursor()
+    try:
+        cursor.execute("INSERT INTO categorias (nome, tipo) VALUES (?, ?)", (nome, tipo))
+    finally:
+        _invalidar_registro_categorias()
 
 def deletar_categoria_db(page: ft.Page, id):
     """Remove uma categoria"""
-    conn = sqlite3.connect("financeiro.db")
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM categorias WHERE id=?", (id,))
-    conn.commit()
-    conn.close()
+    cursor = _conexao().cursor()
+    try:
+        cursor.execute(_SQL_CATEGORIA_DELETAR, (id,))
+    finally:
+        _invalidar_registro_categorias()
 
 def buscar_metas_db(page: ft.Page):
     """Busca todas as metas"""
-    conn = sqlite3.connect("financeiro.db")
-    cursor = conn.cursor()
-    cursor.execute("SELECT * FROM metas ORDER BY nome")
-    
-    metas = []
-    for row in cursor.fetchall():
-        metas.append({
-            "id": row[0],
-            "nome": row[1],
-            "valor_objetivo": row[2],
-            "valor_atual": row[3]
-        })
-    
-    conn.close()
-    return metas
+    cursor = _conexao().cursor()
+    cursor.row_factory = _linha_para_meta
+    cursor.execute(_SQL_METAS_TODAS)
+    return cursor.fetchall()
 
 def adicionar_meta_db(page: ft.Page, nome, valor_objetivo):
     """Adiciona uma nova meta"""
-    conn = sqlite3.connect("financeiro.db")
-    cursor = conn.cursor()
+    cursor = _conexao().cursor()
     cursor.execute("INSERT INTO metas (nome, valor_objetivo) VALUES (?, ?)", (nome, valor_objetivo))
-    conn.commit()
-    conn.close()
 
 def atualizar_valor_meta_db(page: ft.Page, id, novo_valor):
     """Atualiza o valor atual de uma meta"""
-    conn = sqlite3.connect("financeiro.db")
-    cursor = conn.cursor()
-    cursor.execute("UPDATE metas SET valor_atual=? WHERE id=?", (novo_valor, id))
-    conn.commit()
-    conn.close()
+    cursor = _conexao().cursor()
+    cursor.execute(_SQL_META_ATUALIZAR_VALOR, (novo_valor, id))
+
+def movimentar_meta_db(page: ft.Page, id, valor, ultima_alteracao=None, data=None):
+    """Deposita (valor > 0) ou retira (valor < 0) de uma meta, registrando a transação correspondente.
+
+    Meta, transação e, se informado, o texto de ultima_alteracao são gravados
+    numa única transação BEGIN IMMEDIATE: ou tudo é gravado, ou nada.
+    Retorna a Meta atualizada.
+    """
+    conn = _conexao()
+    with _transacao(conn, imediata=True):
+        row = conn.execute(_SQL_META_LER, (id,)).fetchone()
+        if row is None:
+            raise ValueError("Meta não encontrada.")
+        meta = Meta(*row)
+
+        if valor > 0:
+            novo_valor = meta.valor_atual + valor
+            if meta.valor_objetivo > 0:
+                novo_valor = min(novo_valor, meta.valor_objetivo)
+            tipo, descricao, categoria = "Despesa", f"Depósito na meta: {meta.nome}", "Depósito em Meta"
+        elif valor < 0:
+            if -valor > meta.valor_atual:
+                raise ValueError("Valor maior que o saldo da meta.")
+            novo_valor = max(0.0, meta.valor_atual + valor)
+            tipo, descricao, categoria = "Receita", f"Retirada da meta: {meta.nome}", "Retirada de Meta"
+        else:
+            raise ValueError("Informe um valor diferente de zero.")
+
+        conn.execute(_SQL_META_ATUALIZAR_VALOR, (novo_valor, id))
+        conn.execute(
+            _SQL_TRANSACAO_INSERIR,
+            _linha_para_gravar(tipo, descricao, abs(valor), categoria, data or date.today())
+        )
+        if ultima_alteracao is not None:
+            conn.execute(_SQL_CONFIG_GRAVAR, ("ultima_alteracao", ultima_alteracao))
+            # Ainda com o lock de escrita: o gravador de configurações só pega os
+            # pendentes depois do commit, quando o valor antigo já saiu da fila
+            _config_gravada("ultima_alteracao", ultima_alteracao)
+    return meta._replace(valor_atual=novo_valor)
 
 def deletar_meta_db(page: ft.Page, id):
     """Remove uma meta"""
-    conn = sqlite3.connect("financeiro.db")
-    cursor = conn.cursor()
-    cursor.execute("DELETE FROM metas WHERE id=?", (id,))
-    conn.commit()
-    conn.close()
+    cursor = _conexao().cursor()
+    cursor.execute(_SQL_META_DELETAR, (id,))
 
 def set_config_value_db(page: ft.Page, chave, valor):
-    """Salva um valor de configuração"""
-    conn = sqlite3.connect("financeiro.db")
-    cursor = conn.cursor()
-    cursor.execute("INSERT OR REPLACE INTO configuracoes (chave, valor) VALUES (?, ?)", (chave, valor))
-    conn.commit()
-    conn.close()
+    """Salva um valor de configuração (no cache na hora, no banco em até INTERVALO_GRAVACAO_CONFIG_MS)"""
+    global _config_gravador
+    with _config_lock:
+        _carregar_config()[chave] = valor
+        _config_pendentes[chave] = valor
+        if _config_gravador is None:
+            _config_gravador = threading.Thread(target=_gravador_config, name="gravador-config", daemon=True)
+            _config_gravador.start()
+    _config_sinal.set()
 
 def get_config_value_db(page: ft.Page, chave):
-    """Recupera um valor de configuração"""
-    conn = sqlite3.connect("financeiro.db")
-    cursor = conn.cursor()
-    cursor.execute("SELECT valor FROM configuracoes WHERE chave=?", (chave,))
-    result = cursor.fetchone()
-    conn.close()
-    return result[0] if result else None
\ No newline at end of file
+    """Recupera um valor de configuração (do cache em memória)"""
+    with _config_lock:
+        return _carregar_config().get(chave)
+
+# =============================================================================
+# CACHE DE CONFIGURAÇÕES
+# =============================================================================
+
+# Alterações feitas dentro deste intervalo são gravadas juntas, numa só escrita
+INTERVALO_GRAVACAO_CONFIG_MS = 500
+
+_config = None            # chave -> valor; tabela configuracoes inteira, carregada uma vez
+_config_pendentes = {}    # chave -> valor ainda não gravado no banco
+_config_lock = threading.Lock()
+_config_sinal = threading.Event()
+_config_gravador = None
+
+
+def _carregar_config():
+    """Retorna o cache, carregando a tabela na primeira vez (chamar com _config_lock adquirida)"""
+    global _config
+    if _config is None:
+        _config = dict(_conexao().execute(_SQL_CONFIG_TODAS))
+    return _config
+
+
+def _invalidar_config():
+    """Descarta o cache (o banco pode ter sido substituído); a próxima leitura recarrega"""
+    global _config
+    with _config_lock:
+        _config = None
+
+
+def _config_gravada(chave, valor):
+    """Registra no cache um valor que já foi gravado no banco por outra operação"""
+    with _config_lock:
+        if _config is not None:
+            _config[chave] = valor
+        # Um valor pendente mais antigo não pode sobrescrever o que acabou de ser gravado
+        _config_pendentes.pop(chave, None)
+
+
+def gravar_config_pendentes():
+    """Grava de uma vez as configurações alteradas desde a última gravação.
+
+    Os pendentes são lidos já com o lock de escrita do banco (BEGIN IMMEDIATE):
+    uma gravação concorrente da mesma chave (ex.: movimentar_meta_db) ou terminou
+    antes e tirou o valor antigo da fila, ou espera este commit e grava depois.
+    """
+    with _config_lock:
+        if not _config_pendentes:
+            return
+    pendentes = {}
+    try:
+        with _arquivo_lock, _transacao(imediata=True):
+            with _config_lock:
+                pendentes = dict(_config_pendentes)
+                _config_pendentes.clear()
+            _conexao().executemany(_SQL_CONFIG_GRAVAR, pendentes.items())
+    except sqlite3.Error as ex:
+        print(f"ERRO AO GRAVAR CONFIGURAÇÕES: {ex}")
+        with _config_lock:
+            # Devolve à fila o que não foi substituído por um valor mais novo
+            for chave, valor in pendentes.items():
+                _config_pendentes.setdefault(chave, valor)
+
+
+def _gravador_config():
+    """Thread que agrupa as alterações de configuração e grava no máximo uma vez por intervalo"""
+    while True:
+        _config_sinal.wait()
+        time.sleep(INTERVALO_GRAVACAO_CONFIG_MS / 1000)
+        _config_sinal.clear()
+        gravar_config_pendentes()
+
+
+# =============================================================================
+# REGISTRO DE CATEGORIAS
+# =============================================================================
+
+_registro = None
+_registro_versao = 0
+_registro_lock = threading.Lock()
+
+
+def _invalidar_registro_categorias():
+    global _registro
+    with _registro_lock:
+        _registro = None
+
+
+def _banco_alterado_por_outra_conexao():
+    """Indica se outra conexão gravou no banco desde a última verificação nesta thread.
+
+    PRAGMA data_version só muda quando outra conexão faz commit; as gravações
+    de categorias desta conexão já invalidam o registro explicitamente. Na
+    primeira verificação de uma conexão não há como saber, então conta como alterado.
+    """
+    conn = _conexao()
+    versao = conn.execute("PRAGMA data_version").fetchone()[0]
+    anterior = getattr(_local, "data_version", None)
+    _local.data_version = (conn, versao)
+    return anterior != (conn, versao)
+
+
+def registro_categorias_db(page: ft.Page):
+    """Registro das categorias em memória (nome -> tipo e tipo -> nomes), recarregado só quando necessário.
+
+    Um commit de outra conexão (o escritor do app, o gravador de configurações)
+    faz a tabela categorias ser relida, mas a versão só muda se ela mudou de fato:
+    gravar transações ou configurações não refaz as listas de categorias da tela.
+    """
+    global _registro, _registro_versao
+    alterado = _banco_alterado_por_outra_conexao()
+    with _registro_lock:
+        if _registro is None or alterado:
+            cursor = _conexao().cursor()
+            cursor.row_factory = _linha_para_categoria
+            categorias = tuple(cursor.execute(_SQL_CATEGORIAS_TODAS))
+            if _registro is not None and categorias == _registro.categorias:
+                return _registro
+            nomes_por_tipo = {}
+            for cat in categorias:
+                nomes_por_tipo.setdefault(cat.tipo, []).append(cat.nome)
+            _registro_versao += 1
+            _registro = RegistroCategorias(
+                versao=_registro_versao,
+                categorias=categorias,
+                tipo_por_nome={cat.nome: cat.tipo for cat in categorias},
+                nomes_por_tipo={tipo: tuple(nomes) for tipo, nomes in nomes_por_tipo.items()},
+            )
+        return _registro
+
+
+# =============================================================================
+# BACKUP E RESTAURAÇÃO
+# =============================================================================
+
+# Páginas copiadas por passo do backup; entre um passo e outro o banco fica livre para gravações
+PAGINAS_POR_PASSO_BACKUP = 256
+PAUSA_ENTRE_PASSOS_BACKUP = 0.005  # segundos
+
+
+def verificar_integridade(conn):
+    """Roda PRAGMA integrity_check e lança sqlite3.DatabaseError se o banco estiver corrompido"""
+    problemas = [linha[0] for linha in conn.execute("PRAGMA integrity_check")]
+    if problemas != ["ok"]:
+        raise sqlite3.DatabaseError(f"Falha na verificação de integridade: {'; '.join(problemas[:5])}")
+
+
+def fazer_backup_db(page: ft.Page, destino, ao_progresso=None, paginas_por_passo=PAGINAS_POR_PASSO_BACKUP):
+    """Copia o banco para destino com a API de backup do SQLite, sem parar o app.
+
+    A cópia é feita em passos de paginas_por_passo páginas, num arquivo
+    temporário ao lado do destino; ao_progresso(fracao) é chamado após cada
+    passo. A cópia só substitui o destino depois de passar no integrity_check,
+    então um backup interrompido nunca deixa um arquivo pela metade.
+    """
+    gravar_config_pendentes()
+    temporario = destino + ".tmp"
+    if os.path.exists(temporario):
+        os.remove(temporario)
+
+    def progresso(status, restantes, total):
+        if ao_progresso and total:
+            ao_progresso((total - restantes) / total)
+        # Cede a vez às outras threads (e gravações) entre um passo e outro
+        time.sleep(PAUSA_ENTRE_PASSOS_BACKUP)
+
+    # Conexão própria para a origem: a transação de leitura aberta abaixo fixa
+    # um retrato do banco (WAL), então gravações feitas durante a cópia não
+    # obrigam o backup a recomeçar, e também não ficam bloqueadas por ele.
+    origem = _abrir_conexao()
+    copia = sqlite3.connect(temporario)
+    try:
+        origem.execute("BEGIN")
+        origem.execute("SELECT COUNT(*) FROM sqlite_master").fetchone()
+        origem.backup(copia, pages=paginas_por_passo, progress=progresso)
+        origem.execute("COMMIT")
+        # O backup é um arquivo único, sem -wal ao lado
+        copia.execute("PRAGMA journal_mode=DELETE")
+        verificar_integridade(copia)
+    except BaseException:
+        copia.close()
+        os.remove(temporario)
+        raise
+    finally:
+        origem.close()
+    copia.close()
+    os.replace(temporario, destino)
+
+
+# Tabelas e colunas que um backup precisa ter, em qualquer versão do esquema
+ESQUEMA_MINIMO_BACKUP = {
+    "transacoes": {"id", "tipo", "descricao", "categoria", "data"},
+    "categorias": {"id", "nome", "tipo"},
+    "metas": {"id", "nome", "valor_objetivo", "valor_atual"},
+}
+
+# Tabelas comparadas após a restauração, para recarregar só o que mudou
+TABELAS_DE_DADOS = ("transacoes", "categorias", "metas", "configuracoes")
+
+
+def _validar_backup(conn):
+    """Confere se o arquivo é um banco deste app, de uma versão que sabemos migrar"""
+    try:
+        versao = conn.execute("PRAGMA user_version").fetchone()[0]
+        tabelas = {
+            nome: {coluna[1] for coluna in conn.execute(f"PRAGMA table_info({nome})")}
+            for nome in ESQUEMA_MINIMO_BACKUP
+        }
+    except sqlite3.DatabaseError:
+        raise ValueError("O arquivo escolhido não é um banco de dados válido.") from None
+
+    if versao > len(MIGRACOES):
+        raise ValueError("O backup é de uma versão mais nova do app.")
+    for nome, colunas in ESQUEMA_MINIMO_BACKUP.items():
+        faltando = colunas - tabelas[nome]
+        if faltando:
+            raise ValueError(f"O backup não tem a tabela '{nome}' completa (faltam: {', '.join(sorted(faltando))}).")
+    if not {"valor", "valor_centavos"} & tabelas["transacoes"]:
+        raise ValueError("O backup não tem a coluna de valor das transações.")
+    verificar_integridade(conn)
+
+
+def _tabelas_alteradas(novo, caminho_atual):
+    """Compara o banco restaurado com o atual e retorna as tabelas cujo conteúdo mudou"""
+    novo.execute("ATTACH DATABASE ? AS atual", (caminho_atual,))
+    alteradas = set()
+    try:
+        for tabela in TABELAS_DE_DADOS:
+            colunas = ", ".join(coluna[1] for coluna in novo.execute(f"PRAGMA main.table_info({tabela})"))
+            try:
+                diferente = novo.execute(
+                    f"SELECT EXISTS (SELECT {colunas} FROM main.{tabela} EXCEPT SELECT {colunas} FROM atual.{tabela})"
+                    f" OR EXISTS (SELECT {colunas} FROM atual.{tabela} EXCEPT SELECT {colunas} FROM main.{tabela})"
+                ).fetchone()[0]
+            except sqlite3.OperationalError:
+                diferente = True  # tabela ou coluna ausente no banco atual
+            if diferente:
+                alteradas.add(tabela)
+    finally:
+        novo.execute("DETACH DATABASE atual")
+    return alteradas
+
+
+def restaurar_backup_db(page: ft.Page, origem, ao_progresso=None, pausar_leituras=None):
+    """Substitui o banco atual por um backup, validado e migrado antes da troca.
+
+    O backup é aberto só para leitura e validado; depois é copiado para um
+    arquivo temporário ao lado do banco, onde recebe as migrações pendentes e
+    passa pelo integrity_check. Só então as conexões são fechadas e o arquivo
+    temporário é renomeado por cima do banco (operação atômica). Se algo falhar
+    antes disso, o banco atual fica intocado.
+
+    ao_progresso(etapa, fracao) recebe a descrição da etapa e a fração
+    concluída (None quando não há como medir). pausar_leituras, se informado,
+    é um gerenciador de contexto que impede as outras threads de usar o banco
+    durante a troca (ex.: ExecutorBanco.leituras_pausadas). Retorna o conjunto
+    das tabelas de TABELAS_DE_DADOS cujo conteúdo mudou.
+    """
+    def etapa(texto, fracao=None):
+        if ao_progresso:
+            ao_progresso(texto, fracao)
+
+    gravar_config_pendentes()
+    temporario = DB_PATH + ".restaurar"
+    for caminho in (temporario, temporario + "-journal"):
+        if os.path.exists(caminho):
+            os.remove(caminho)
+
+    etapa("Validando o backup...")
+    candidato = sqlite3.connect(Path(origem).resolve().as_uri() + "?mode=ro", uri=True)
+    novo = sqlite3.connect(temporario, isolation_level=None)
+    try:
+        _validar_backup(candidato)
+
+        def progresso(status, restantes, total):
+            if total:
+                etapa("Copiando o backup...", (total - restantes) / total)
+        candidato.backup(novo, pages=PAGINAS_POR_PASSO_BACKUP, progress=progresso)
+        candidato.close()
+        novo.execute("PRAGMA journal_mode=DELETE")
+
+        etapa("Atualizando o formato dos dados...")
+        _preparar_banco(novo)
+        verificar_integridade(novo)
+
+        etapa("Comparando com os dados atuais...")
+        alteradas = _tabelas_alteradas(novo, DB_PATH)
+    except BaseException:
+        candidato.close()
+        novo.close()
+        os.remove(temporario)
+        raise
+    novo.close()
+
+    etapa("Substituindo os dados...")
+    # Sem leituras em andamento e sem o gravador de configurações, ninguém
+    # está usando as conexões fechadas aqui nem reabre o arquivo antigo
+    with (pausar_leituras() if pausar_leituras else nullcontext()), _arquivo_lock:
+        fechar_conexoes()
+        # O -wal do banco antigo não pode ser aplicado por cima do arquivo novo
+        for sufixo in ("-wal", "-shm"):
+            if os.path.exists(DB_PATH + sufixo):
+                os.remove(DB_PATH + sufixo)
+        os.replace(temporario, DB_PATH)
+    return alteradas
+
+
+# =============================================================================
+# DIAGNÓSTICO
+# =============================================================================
+
+# Toda função pública *_db passa a ser medida (tempo, linhas, chamadas lentas);
+# as chamadas internas entre elas também, pois resolvem o nome no módulo
+for _nome, _funcao in list(globals().items()):
+    if _nome.endswith("_db") and callable(_funcao):
+        globals()[_nome] = diagnostico.instrumentar(_funcao)
+del _nome, _funcao
@@ -0,0 +1,138 @@
+# diagnostico.py
+#
+# Medição das funções *_db do database.py: chamadas, tempo e linhas devolvidas.
+# Chamadas mais lentas que o limite configurado vão para um arquivo de log
+# rotativo; o painel de diagnóstico em Ajustes mostra o resumo. O arquivo só
+# é gravado depois de ativar_log(), chamado pelo app (as ferramentas de linha
+# de comando só medem, sem criar arquivo na pasta em que rodam).
+
+from logging.handlers import RotatingFileHandler
+import functools
+import atexit
+import threading
+import logging
+import time
+
+ARQUIVO_LOG = "financeiro_diagnostico.log"
+TAMANHO_MAXIMO_LOG = 1024 * 1024  # bytes por arquivo
+ARQUIVOS_LOG_ANTIGOS = 3
+
+# Chamadas que demoram mais que isto são registradas no log como lentas
+limite_lenta_ms = 100.0
+
+_estatisticas = {}  # nome da função -> dict com os contadores
+_lock = threading.Lock()
+_logger = None
+_log_ativo = False
+
+
+def _obter_logger():
+    """Logger com o arquivo rotativo, criado na primeira vez que algo é registrado"""
+    global _logger
+    with _lock:
+        if _logger is None:
+            _logger = logging.getLogger("financeiro.db")
+            _logger.setLevel(logging.INFO)
+            _logger.propagate = False
+            manipulador = RotatingFileHandler(
+                ARQUIVO_LOG, maxBytes=TAMANHO_MAXIMO_LOG, backupCount=ARQUIVOS_LOG_ANTIGOS, encoding="utf-8"
+            )
+            manipulador.setFormatter(logging.Formatter("%(asctime)s %(levelname)s %(message)s"))
+            _logger.addHandler(manipulador)
+    return _logger
+
+
+def configurar(limite_ms=None, arquivo_log=None):
+    """Ajusta o limite de chamada lenta e/ou o arquivo de log (antes do primeiro registro)"""
+    global limite_lenta_ms, ARQUIVO_LOG
+    if limite_ms is not None:
+        limite_lenta_ms = float(limite_ms)
+    if arquivo_log is not None:
+        ARQUIVO_LOG = arquivo_log
+
+
+def ativar_log(arquivo_log=None):
+    """Passa a gravar o log (chamadas lentas, erros e o resumo ao fechar o programa)"""
+    global _log_ativo
+    configurar(arquivo_log=arquivo_log)
+    if not _log_ativo:
+        _log_ativo = True
+        atexit.register(exportar)
+
+
+def _registrar(nivel, mensagem, *args):
+    if _log_ativo:
+        _obter_logger().log(nivel, mensagem, *args)
+
+
+def _contar_linhas(resultado):
+    if isinstance(resultado, (list, dict)):
+        return len(resultado)
+    return 0 if resultado is None else 1
+
+
+def instrumentar(funcao):
+    """Decorador que mede cada chamada de funcao"""
+    nome = funcao.__name__
+
+    @functools.wraps(funcao)
+    def medida(*args, **kwargs):
+        inicio = time.perf_counter()
+        erro = None
+        try:
+            resultado = funcao(*args, **kwargs)
+            return resultado
+        except BaseException as ex:
+            erro, resultado = ex, None
+            raise
+        finally:
+            ms = (time.perf_counter() - inicio) * 1000
+            linhas = _contar_linhas(resultado)
+            lenta = ms >= limite_lenta_ms
+            with _lock:
+                est = _estatisticas.setdefault(nome, {
+                    "chamadas": 0, "erros": 0, "lentas": 0, "linhas": 0, "tempo_total_ms": 0.0, "tempo_max_ms": 0.0,
+                })
+                est["chamadas"] += 1
+                est["linhas"] += linhas
+                est["tempo_total_ms"] += ms
+                est["tempo_max_ms"] = max(est["tempo_max_ms"], ms)
+                if lenta:
+                    est["lentas"] += 1
+                if erro is not None:
+                    est["erros"] += 1
+            if lenta:
+                _registrar(logging.WARNING, "LENTA %s: %.1f ms, %d linhas", nome, ms, linhas)
+            if erro is not None:
+                _registrar(logging.ERROR, "ERRO %s após %.1f ms: %r", nome, ms, erro)
+
+    return medida
+
+
+def estatisticas():
+    """Resumo por função, das que mais tempo consumiram para as que menos consumiram"""
+    with _lock:
+        linhas = [dict(est, funcao=nome) for nome, est in _estatisticas.items()]
+    for est in linhas:
+        est["tempo_medio_ms"] = est["tempo_total_ms"] / est["chamadas"]
+    return sorted(linhas, key=lambda est: est["tempo_total_ms"], reverse=True)
+
+
+def zerar():
+    with _lock:
+        _estatisticas.clear()
+
+
+def exportar():
+    """Grava o resumo atual no arquivo de log"""
+    resumo = estatisticas()
+    if not resumo or not _log_ativo:
+        return
+    logger = _obter_logger()
+    logger.info("RESUMO (%d funções, limite de lentidão %.0f ms)", len(resumo), limite_lenta_ms)
+    for est in resumo:
+        logger.info(
+            "  %s: %d chamadas, média %.2f ms, máx %.2f ms, %d linhas, %d lentas, %d erros",
+            est["funcao"], est["chamadas"], est["tempo_medio_ms"], est["tempo_max_ms"],
+            est["linhas"], est["lentas"], est["erros"],
+        )
@@ -0,0 +1,202 @@
+# executor_db.py
+#
+# Acesso ao banco fora das threads de eventos do Flet.
+# Leituras rodam em paralelo num pool de threads (cada thread tem a sua
+# conexão, ver database._conexao); gravações vão para uma única thread, em
+# ordem, e não disputam entre si o lock de escrita do SQLite. A exceção é o
+# gravador de configurações de database.py (set_config_value_db), que grava
+# agrupado na sua própria thread: ele pega o lock com BEGIN IMMEDIATE e o
+# busy_timeout das conexões faz um esperar pelo outro.
+#
+# ler() e gravar() devolvem um concurrent.futures.Future: quem preferir
+# async pode fazer "await asyncio.wrap_future(futuro)"; os handlers do app
+# usam os callbacks ao_concluir / ao_falhar.
+
+from concurrent.futures import ThreadPoolExecutor, CancelledError
+from contextlib import contextmanager
+import database as db
+import sqlite3
+import threading
+import traceback
+
+# Threads de leitura simultâneas (o SQLite em WAL permite leitores em paralelo ao escritor)
+LEITORES = 3
+
+
+class _Leitura:
+    """Estado de uma leitura com chave, para cancelá-la quando ficar obsoleta"""
+
+    def __init__(self):
+        self.futuro = None
+        self.conexao = None  # conexão onde a consulta está rodando agora
+        self.trava = threading.Lock()
+
+    def interromper(self):
+        # Só interrompe se a consulta ainda estiver rodando: a conexão é
+        # desmarcada (sob a trava) antes de a thread pegar a próxima tarefa
+        with self.trava:
+            if self.conexao is not None:
+                self.conexao.interrupt()
+
+
+class ExecutorBanco:
+    def __init__(self, leitores=LEITORES):
+        self._leitura = ThreadPoolExecutor(max_workers=leitores, thread_name_prefix="db-leitura")
+        self._escrita = ThreadPoolExecutor(max_workers=1, thread_name_prefix="db-escrita")
+        self._lock = threading.Lock()
+        self._recentes = {}    # chave -> _Leitura mais recente
+        self._travas = {}      # chave -> trava dos callbacks (um de cada vez, por chave)
+        self._pendentes = set()
+        # Pausa das leituras (ex.: enquanto o arquivo do banco é trocado)
+        self._pausa = threading.Condition()
+        self._pausado = False
+        self._leituras_ativas = 0
+
+    def ler(self, funcao, *args, chave=None, ao_concluir=None, ao_falhar=None, **kwargs):
+        """Agenda uma leitura no pool de leitores.
+
+        Com chave, uma leitura nova com a mesma chave torna a anterior
+        obsoleta: se ainda não começou, é cancelada; se está rodando, a
+        consulta é interrompida; e o resultado de uma leitura obsoleta nunca
+        é entregue a ao_concluir.
+        """
+        if chave is None:
+            return self._agendar(self._leitura, funcao, args, kwargs, ao_concluir, ao_falhar)
+
+        leitura = _Leitura()
+        trava = self._substituir(chave, leitura)
+
+        def obsoleta():
+            return self._recentes.get(chave) is not leitura
+
+        def tarefa():
+            if obsoleta():
+                raise CancelledError()
+            with leitura.trava:
+                leitura.conexao = db._conexao()
+            try:
+                return funcao(*args, **kwargs)
+            except sqlite3.OperationalError:
+                if obsoleta():
+                    raise CancelledError() from None  # interrompida por uma leitura mais nova
+                raise
+            finally:
+                with leitura.trava:
+                    leitura.conexao = None
+
+        def concluir(resultado):
+            # Callbacks da mesma chave não se intercalam, e o de uma leitura
+            # que ficou obsoleta enquanto esperava a vez é descartado
+            with trava:
+                if ao_concluir and not obsoleta():
+                    ao_concluir(resultado)
+
+        leitura.futuro = self._agendar(self._leitura, tarefa, (), {}, concluir, ao_falhar)
+        return leitura.futuro
+
+    def cancelar(self, chave):
+        """Torna obsoleta a leitura pendente com esta chave, sem agendar outra.
+
+        Para quando o resultado foi obtido por outro caminho (ex.: da memória)
+        e a leitura antiga não deve mais chegar a ao_concluir.
+        """
+        self._substituir(chave, _Leitura())
+
+    def _substituir(self, chave, leitura):
+        # Publica a leitura como a mais recente da chave e derruba a anterior;
+        # devolve a trava dos callbacks da chave
+        with self._lock:
+            anterior = self._recentes.get(chave)
+            self._recentes[chave] = leitura
+            trava = self._travas.setdefault(chave, threading.Lock())
+        if anterior is not None:
+            # Publicada por outra thread que ainda não a agendou, ou por
+            # cancelar() (futuro None): ao rodar, a tarefa dela já se vê obsoleta
+            if anterior.futuro is not None:
+                anterior.futuro.cancel()
+            anterior.interromper()
+        return trava
+
+    def gravar(self, funcao, *args, ao_concluir=None, ao_falhar=None, **kwargs):
+        """Agenda uma gravação na thread de escrita; as gravações rodam na ordem em que foram pedidas"""
+        return self._agendar(self._escrita, funcao, args, kwargs, ao_concluir, ao_falhar)
+
+    @contextmanager
+    def leituras_pausadas(self):
+        """Segura as leituras novas e espera as em andamento (e seus callbacks) terminarem.
+
+        Usado na troca do arquivo do banco, para nenhuma thread de leitura estar
+        com a conexão em uso quando ela for fechada. Não chamar de uma thread de leitura.
+        """
+        with self._pausa:
+            self._pausado = True
+            self._pausa.wait_for(lambda: self._leituras_ativas == 0)
+        try:
+            yield
+        finally:
+            with self._pausa:
+                self._pausado = False
+                self._pausa.notify_all()
+
+    def esperar(self):
+        """Bloqueia até que todas as tarefas agendadas (e seus callbacks) terminem"""
+        while True:
+            with self._lock:
+                pendentes = list(self._pendentes)
+            if not pendentes:
+                return
+            for futuro in pendentes:
+                try:
+                    futuro.result()
+                except BaseException:
+                    pass
+
+    def encerrar(self):
+        """Termina as tarefas já agendadas e libera as threads"""
+        self._leitura.shutdown(wait=True)
+        self._escrita.shutdown(wait=True)
+
+    def _agendar(self, pool, funcao, args, kwargs, ao_concluir, ao_falhar):
+        # O futuro devolvido só termina depois do callback, para que esperar()
+        # e quem aguarda o resultado vejam a interface já atualizada
+        def executar():
+            try:
+                resultado = funcao(*args, **kwargs)
+            except CancelledError:
+                raise
+            except Exception as ex:
+                if ao_falhar:
+                    ao_falhar(ex)
+                else:
+                    print(f"ERRO NO BANCO: {traceback.format_exc()}")
+                raise
+            if ao_concluir:
+                ao_concluir(resultado)
+            return resultado
+
+        if pool is self._leitura:
+            executar = self._como_leitura(executar)
+
+        futuro = pool.submit(executar)
+        with self._lock:
+            self._pendentes.add(futuro)
+        futuro.add_done_callback(self._concluido)
+        return futuro
+
+    def _como_leitura(self, executar):
+        # Leituras esperam uma pausa acabar e contam como ativas até o fim do callback
+        def leitura():
+            with self._pausa:
+                self._pausa.wait_for(lambda: not self._pausado)
+                self._leituras_ativas += 1
+            try:
+                return executar()
+            finally:
+                with self._pausa:
+                    self._leituras_ativas -= 1
+                    self._pausa.notify_all()
+        return leitura
+
+    def _concluido(self, futuro):
+        with self._lock:
+            self._pendentes.discard(futuro)
@@ -0,0 +1,248 @@
+# importacao.py
+#
+# Importação de extratos bancários (CSV e OFX).
+# Os arquivos são lidos em streaming: nenhuma etapa carrega o arquivo inteiro
+# na memória, então extratos com centenas de milhares de linhas funcionam.
+
+from datetime import datetime
+import database as db
+import unicodedata
+import csv
+import math
+import io
+import os
+import re
+
+# Nomes de coluna aceitos nos CSVs (já sem acentos e em minúsculas)
+COLUNAS_CSV = {
+    "data": {"data", "date", "data lancamento", "data do lancamento", "data movimento"},
+    "descricao": {"descricao", "historico", "lancamento", "memo", "description", "estabelecimento"},
+    "valor": {"valor", "valor (r$)", "value", "amount", "quantia"},
+    "categoria": {"categoria", "category"},
+    "tipo": {"tipo", "type"},
+}
+
+# Bytes lidos do início do arquivo para descobrir codificação e separador
+TAMANHO_AMOSTRA = 64 * 1024
+
+
+class _DialetoPadrao(csv.excel):
+    delimiter = ";"
+
+
+def _normalizar(texto):
+    """Minúsculas e sem acentos, para comparar nomes de coluna."""
+    texto = unicodedata.normalize("NFKD", texto.strip().lower())
+    return "".join(c for c in texto if not unicodedata.combining(c))
+
+
+def _detectar_codificacao(amostra):
+    for codificacao in ("utf-8-sig", "cp1252"):
+        try:
+            amostra.decode(codificacao)
+            return codificacao
+        except UnicodeDecodeError as ex:
+            # A amostra pode ter cortado um caractere multibyte no final
+            if ex.reason == "unexpected end of data":
+                return codificacao
+            continue
+    return "latin-1"
+
+
+def _converter_valor(texto):
+    """Aceita '1.234,56', '1234.56', '-12,30', 'R$ 10,00' e devolve um float."""
+    texto = texto.replace("R$", "").replace(" ", "").strip()
+    negativo = texto.startswith("-") or (texto.startswith("(") and texto.endswith(")"))
+    texto = texto.strip("-+()")
+    if "," in texto and "." in texto:
+        # O separador que aparece por último é o decimal
+        if texto.rfind(",") > texto.rfind("."):
+            texto = texto.replace(".", "").replace(",", ".")
+        else:
+            texto = texto.replace(",", "")
+    else:
+        texto = texto.replace(",", ".")
+    try:
+        valor = float(texto)
+    except ValueError:
+        raise ValueError(f"valor inválido: '{texto}'") from None
+    # float() aceita "nan" e "inf", que não viram centavos
+    if not math.isfinite(valor):
+        raise ValueError(f"valor inválido: '{texto}'")
+    return -valor if negativo else valor
+
+
+def _converter_data(texto):
+    texto = texto.strip()
+    for formato in ("%d/%m/%Y", "%Y-%m-%d", "%d/%m/%y", "%d-%m-%Y", "%Y%m%d"):
+        try:
+            return datetime.strptime(texto, formato).date()
+        except ValueError:
+            continue
+    raise ValueError(f"data inválida: '{texto}'")
+
+
+def _converter_tipo(texto, valor):
+    tipo = _normalizar(texto or "")
+    if tipo in ("receita", "credito", "c", "credit"):
+        return "Receita"
+    if tipo in ("despesa", "debito", "d", "debit"):
+        return "Despesa"
+    return "Receita" if valor >= 0 else "Despesa"
+
+
+def _transacao(tipo, descricao, valor, categoria, data):
+    return {
+        "tipo": tipo,
+        "descricao": descricao.strip() or "(sem descrição)",
+        "valor": abs(valor),
+        "categoria": categoria.strip() if categoria else None,
+        "data": data,
+    }
+
+
+# =============================================================================
+# CSV
+# =============================================================================
+
+def ler_csv(texto):
+    """Gera transações de um arquivo CSV aberto em modo texto, uma linha por vez."""
+    amostra = texto.read(TAMANHO_AMOSTRA)
+    try:
+        dialeto = csv.Sniffer().sniff(amostra, delimiters=";,\t|")
+    except csv.Error:
+        dialeto = _DialetoPadrao
+
+    leitor = csv.reader(_linhas(amostra, texto), dialeto)
+
+    cabecalho = next(leitor, None)
+    if cabecalho is None:
+        return
+    indices = {}
+    for i, nome in enumerate(cabecalho):
+        for campo, aliases in COLUNAS_CSV.items():
+            if _normalizar(nome) in aliases and campo not in indices:
+                indices[campo] = i
+    faltando = {"data", "descricao", "valor"} - set(indices)
+    if faltando:
+        raise ValueError(f"Colunas obrigatórias não encontradas no CSV: {', '.join(sorted(faltando))}")
+
+    for numero, linha in enumerate(leitor, start=2):
+        if not any(campo.strip() for campo in linha):
+            continue
+        try:
+            valor = _converter_valor(linha[indices["valor"]])
+            tipo = _converter_tipo(linha[indices["tipo"]] if "tipo" in indices else None, valor)
+            categoria = linha[indices["categoria"]] if "categoria" in indices else None
+            yield _transacao(
+                tipo, linha[indices["descricao"]], valor, categoria, _converter_data(linha[indices["data"]])
+            )
+        except (IndexError, ValueError) as ex:
+            yield ValueError(f"linha {numero}: {ex}")
+
+
+def _linhas(amostra, texto):
+    """Linhas da amostra já lida seguidas das restantes, sem reler o arquivo."""
+    restante = texto.readline()
+    buffer = io.StringIO(amostra + restante)
+    yield from buffer
+    yield from texto
+
+
+# =============================================================================
+# OFX
+# =============================================================================
+
+_RE_TAG_OFX = re.compile(r"<(/?)([A-Za-z0-9.]+)>([^<]*)")
+
+
+def _tags_ofx(texto, tamanho_bloco=TAMANHO_AMOSTRA):
+    """Gera (fechamento, tag, valor) lendo o OFX em blocos (SGML ou XML)."""
+    resto = ""
+    while True:
+        bloco = texto.read(tamanho_bloco)
+        if not bloco:
+            break
+        resto += bloco
+        # Só processa até o último '<': a tag seguinte pode estar incompleta
+        corte = resto.rfind("<")
+        processar, resto = resto[:corte], resto[corte:]
+        for fechamento, tag, valor in _RE_TAG_OFX.findall(processar):
+            yield fechamento, tag.upper(), valor.strip()
+    for fechamento, tag, valor in _RE_TAG_OFX.findall(resto):
+        yield fechamento, tag.upper(), valor.strip()
+
+
+def ler_ofx(texto):
+    """Gera transações dos blocos <STMTTRN> de um arquivo OFX."""
+    atual = None
+    for fechamento, tag, valor in _tags_ofx(texto):
+        if tag == "STMTTRN":
+            if not fechamento:
+                atual = {}
+                continue
+            if atual is not None:
+                try:
+                    quantia = _converter_valor(atual.get("TRNAMT", ""))
+                    yield _transacao(
+                        _converter_tipo(None, quantia),
+                        atual.get("MEMO") or atual.get("NAME") or "",
+                        quantia,
+                        None,
+                        _converter_data(atual.get("DTPOSTED", "")[:8]),
+                    )
+                except ValueError as ex:
+                    yield ValueError(f"transação {atual.get('FITID', '?')}: {ex}")
+            atual = None
+        elif atual is not None and not fechamento:
+            atual[tag] = valor
+
+
+# =============================================================================
+# IMPORTAÇÃO
+# =============================================================================
+
+def importar_extrato(page, caminho, ao_progresso=None):
+    """Importa um extrato CSV ou OFX para o banco.
+
+    ao_progresso(fracao, resultado) é chamado a cada lote gravado, com a
+    fração do arquivo já lida (0 a 1) e as contagens parciais.
+    Retorna o dicionário de resultado de db.adicionar_transacoes_lote_db,
+    já incluindo as linhas que não puderam ser lidas.
+    """
+    tamanho = os.path.getsize(caminho) or 1
+    leitura = {"rejeitadas": 0, "erros": []}
+
+    def validas(itens):
+        # Linhas que não puderam ser lidas contam como rejeitadas
+        for item in itens:
+            if isinstance(item, ValueError):
+                leitura["rejeitadas"] += 1
+                if len(leitura["erros"]) < db.MAX_ERROS_IMPORTACAO:
+                    leitura["erros"].append(str(item))
+            else:
+                yield item
+
+    def com_erros_leitura(resultado):
+        resultado = dict(resultado)
+        resultado["rejeitadas"] += leitura["rejeitadas"]
+        resultado["erros"] = (leitura["erros"] + resultado["erros"])[:db.MAX_ERROS_IMPORTACAO]
+        return resultado
+
+    with open(caminho, "rb") as binario:
+        codificacao = _detectar_codificacao(binario.read(TAMANHO_AMOSTRA))
+        binario.seek(0)
+        texto = io.TextIOWrapper(binario, encoding=codificacao, errors="replace", newline="")
+
+        if caminho.lower().endswith(".ofx"):
+            transacoes = ler_ofx(texto)
+        else:
+            transacoes = ler_csv(texto)
+
+        def progresso(resultado):
+            if ao_progresso:
+                ao_progresso(min(binario.tell() / tamanho, 1.0), com_erros_leitura(resultado))
+
+        resultado = db.adicionar_transacoes_lote_db(page, validas(transacoes), ao_progresso=progresso)
+
+    return com_erros_leitura(resultado)
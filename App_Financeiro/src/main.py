@@ -6,13 +6,17 @@ from fpdf import FPDF
 from fpdf.enums import XPos, YPos
 from calendar import month_name
 import database as db
+import diagnostico
+from executor_db import ExecutorBanco
+from armazem import ArmazemTransacoes
+import importacao
 import flet as ft
 import matplotlib
 matplotlib.use("Agg")
 import matplotlib.pyplot as plt  
 import traceback
+import threading
 import itertools
-import shutil
 import sys
 import os
 
@@ -24,11 +28,17 @@ import os
 # =============================================================================
 
 APP_PASSWORD = "162408"
+# Segundos sem digitar no campo de busca antes de a busca rodar
+ATRASO_BUSCA = 0.3
 
 # =============================================================================
 # FUNÇÕES AUXILIARES E UTILITÁRIOS
 # =============================================================================
 
+def formatar_data(data):
+    """Formata a data de uma transação como dd/mm/YYYY."""
+    return data.strftime("%d/%m/%Y")
+
 def criar_imagem_grafico(dados_categoria, titulo, caminho_arquivo, tipo):
     """Cria e salva um gráfico de pizza, usando cores específicas para o tipo."""
     if not dados_categoria:
@@ -100,11 +110,23 @@ def login_screen(page: ft.Page, on_success):
 class FinancialApp:
     def __init__(self, page: ft.Page):
         self.page = page
-        self.todas_transacoes = []
+        # Leituras e gravações do banco rodam fora das threads de eventos
+        self.executor = ExecutorBanco()
+        # Transações dos meses já abertos; gravações são aplicadas aqui como deltas
+        self.armazem = ArmazemTransacoes()
         self.todas_metas = []
         self.mes_selecionado = datetime.now()
         self.id_em_edicao = ft.Text(value=None, visible=False)
+        self.transacao_em_edicao = None
         self.selecionando_data_para = ""
+        # Uma exibição do dashboard por vez (leituras em segundo plano e handlers)
+        self.exibicao_trava = threading.Lock()
+        # Busca agendada enquanto o usuário digita (só a última dispara)
+        self.timer_busca = None
+        self.busca_trava = threading.Lock()
+        # Versão do registro de categorias já exibida (evita refazer as listas sem mudança)
+        self.versao_opcoes_categoria = None
+        self.versao_lista_categorias = None
         
         # --- MUDANÇA IMPORTANTE ---
         # 1. Primeiro, criamos os componentes principais da UI
@@ -162,9 +184,10 @@ class FinancialApp:
         
         # Campo de busca
         self.campo_busca = ft.TextField(
-            label="Buscar transação (descrição)...",
+            label="Buscar transação (descrição ou categoria)...",
             prefix_icon=ft.Icons.SEARCH,
-            on_submit=lambda e: self.atualizar_views(),
+            on_change=self.busca_digitada,
+            on_submit=self.buscar_agora,
         )
         
         # Filtros
@@ -360,8 +383,18 @@ class FinancialApp:
             ),
         )
         
-        # Histórico
-        self.historico_container = ft.Column(spacing=10, visible=False)
+        # Histórico: lista virtualizada, carregada por páginas conforme a rolagem
+        self.historico_container = ft.ListView(
+            spacing=10, height=400, visible=False,
+            on_scroll=self.historico_rolado, on_scroll_interval=100,
+        )
+        self.btn_carregar_mais = ft.TextButton(
+            "Carregar mais", icon=ft.Icons.EXPAND_MORE, on_click=self.carregar_mais_historico
+        )
+        self.historico_linhas = []     # transações do filtro atual, já em ordem
+        self.historico_exibidas = 0
+        self.historico_tem_mais = False
+        self.historico_trava = threading.Lock()
         self.ver_transacoes_btn = ft.Container(
             content=ft.Row([
                 ft.Text("Ver transações"), 
@@ -463,6 +496,14 @@ class FinancialApp:
             )
         )
 
+        # Importação de extratos (progresso exibido durante a importação)
+        self.barra_importacao = ft.ProgressBar(value=0, visible=False)
+        self.txt_status_importacao = ft.Text("", size=12, color="grey", visible=False)
+
+        # Backup e restauração (progresso exibido durante a cópia)
+        self.barra_backup = ft.ProgressBar(value=0, visible=False)
+        self.txt_status_backup = ft.Text("", size=12, color="grey", visible=False)
+
         # Card 2: Backup e Restauração
         card_backup_restauracao = ft.Card(
             elevation=4,
@@ -476,20 +517,48 @@ class FinancialApp:
                         subtitle=ft.Text("Salva uma cópia de segurança dos seus dados."),
                         on_click=self.iniciar_backup,
                     ),
+                    self.barra_backup,
+                    self.txt_status_backup,
                     ft.ListTile(
                         leading=ft.Icon(ft.Icons.DOWNLOAD),
                         title=ft.Text("Restaurar Backup"),
                         subtitle=ft.Text("Substitui os dados atuais por um backup."),
                         on_click=self.iniciar_restauracao,
                     ),
+                    ft.ListTile(
+                        leading=ft.Icon(ft.Icons.RECEIPT_LONG),
+                        title=ft.Text("Importar Extrato"),
+                        subtitle=ft.Text("Adiciona transações de um arquivo CSV ou OFX do banco."),
+                        on_click=self.iniciar_importacao,
+                    ),
+                    self.barra_importacao,
+                    self.txt_status_importacao,
                 ])
             )
         )
         
+        # Card 3: Diagnóstico (tempo gasto em cada consulta ao banco)
+        card_diagnostico = ft.Card(
+            elevation=4,
+            content=ft.Container(
+                padding=15,
+                content=ft.Column([
+                    ft.Text("Diagnóstico", weight=ft.FontWeight.BOLD),
+                    ft.ListTile(
+                        leading=ft.Icon(ft.Icons.SPEED),
+                        title=ft.Text("Desempenho do Banco"),
+                        subtitle=ft.Text("Chamadas, tempo e consultas lentas desde que o app foi aberto."),
+                        on_click=self.abrir_diagnostico,
+                    ),
+                ])
+            )
+        )
+
         self.configuracoes_view = ft.Column([
             ft.Text("Ajustes", size=24, weight=ft.FontWeight.BOLD),
             card_gerenciar_categorias,
             card_backup_restauracao,
+            card_diagnostico,
         ], spacing=15, scroll=ft.ScrollMode.AUTO, visible=False)
         
         self.relatorios_view = ft.Column([
@@ -555,6 +624,7 @@ class FinancialApp:
         self.file_picker_salvar_pdf = ft.FilePicker(on_result=self.salvar_pdf_result)
         self.file_picker_salvar_backup = ft.FilePicker(on_result=self.backup_salvo)
         self.file_picker_abrir_backup = ft.FilePicker(on_result=self.restauracao_concluida)
+        self.file_picker_importar = ft.FilePicker(on_result=self.importacao_selecionada)
 
     def _setup_page(self):
         """Configura a página principal"""
@@ -605,6 +675,7 @@ class FinancialApp:
             self.file_picker_salvar_pdf,
             self.file_picker_salvar_backup,
             self.file_picker_abrir_backup,
+            self.file_picker_importar,
             self.seletor_data, 
             self.seletor_data_relatorio
         ])
@@ -635,17 +706,10 @@ class FinancialApp:
         self.carregar_metas()
         self.carregar_e_exibir_categorias()
         
-        # Carregar timestamp salvo
-        timestamp_salvo = db.get_config_value_db(self.page, 'ultima_alteracao')
-        if timestamp_salvo:
-            self.txt_ultima_atualizacao.value = timestamp_salvo
-        else:
-            self.txt_ultima_atualizacao.value = "Nenhuma alteração registrada."
+        self.carregar_timestamp_salvo()
         
         # Atualizar opções de categoria
-        self.dd_categoria.options = [
-            ft.dropdown.Option(cat['nome']) for cat in db.buscar_categorias_db(self.page)
-        ]
+        self.atualizar_opcoes_categoria(None)
         
         self.page.floating_action_button.visible = False
         self.page.update()
@@ -654,46 +718,170 @@ class FinancialApp:
     # MÉTODOS DE ATUALIZAÇÃO DE TIMESTAMP E DADOS
     # =============================================================================
 
+    def carregar_timestamp_salvo(self):
+        timestamp_salvo = db.get_config_value_db(self.page, 'ultima_alteracao')
+        if timestamp_salvo:
+            self.txt_ultima_atualizacao.value = timestamp_salvo
+        else:
+            self.txt_ultima_atualizacao.value = "Nenhuma alteração registrada."
+
+    def texto_timestamp(self):
+        return f"Última alteração: {datetime.now().strftime('%d/%m/%Y às %H:%M:%S')}"
+
     def atualizar_timestamp_permanente(self):
         """Atualiza o texto da UI e salva a data no banco de dados."""
-        now_str = f"Última alteração: {datetime.now().strftime('%d/%m/%Y às %H:%M:%S')}"
+        now_str = self.texto_timestamp()
         self.txt_ultima_atualizacao.value = now_str
         db.set_config_value_db(self.page, 'ultima_alteracao', now_str)
         self.page.update()
 
     def carregar_dados_iniciais(self):
-        self.todas_transacoes = db.buscar_transacoes_db(self.page)
-        # ADICIONE A LINHA ABAIXO
-        print(f"DEBUG APP: {len(self.todas_transacoes)} transações carregadas do banco.")
         self.atualizar_views()
 
     def atualizar_views(self, e=None):
-        """Carrega as transações do banco (com busca opcional), filtra por mês selecionado e atualiza UI."""
-        termo = self.campo_busca.value.strip() if self.campo_busca.value else None
-        transacoes = db.buscar_transacoes_db(self.page, termo_busca=termo)
-
-        transacoes_do_mes = [
-            t for t in transacoes
-            if datetime.strptime(t["data"], "%d/%m/%Y").month == self.mes_selecionado.month
-            and datetime.strptime(t["data"], "%d/%m/%Y").year == self.mes_selecionado.year
-        ]
+        """Atualiza a UI com o mês selecionado.
 
-        # ADICIONE A LINHA ABAIXO
-        print(f"DEBUG APP: {len(transacoes_do_mes)} transações encontradas para o mês atual.")
+        Um mês já carregado no armazém (e uma busca já feita nele) é exibido na
+        hora, sem banco; senão a leitura vai para segundo plano, e um pedido
+        novo (ex.: trocar de mês ou digitar mais) cancela o anterior.
+        """
+        termo = self._termo_busca()
+        mes = self.mes_selecionado
+        tipo, categoria = self._filtros_historico()
+        if self.armazem.carregado(mes.year, mes.month) and (
+            not termo or self.armazem.busca(mes.year, mes.month, tipo, categoria, termo) is not None
+        ):
+            # Uma leitura ainda em andamento (ex.: a busca anterior) não pode
+            # chegar depois e cobrir o que é exibido agora
+            self.executor.cancelar("dashboard")
+            self._exibir_mes(mes, termo)
+            return
+        self._agendar_mes(mes, termo)
+
+    def _termo_busca(self):
+        return (self.campo_busca.value or "").strip() or None
+
+    def _agendar_mes(self, mes, termo):
+        """Lê o mês (e a busca) em segundo plano e o exibe ao terminar; um pedido novo cancela este"""
+        tipo, categoria = self._filtros_historico()
+        self.executor.ler(
+            self._buscar_mes, mes.year, mes.month, tipo, categoria, termo,
+            chave="dashboard",
+            ao_concluir=lambda _: self._exibir_mes(mes, termo),
+            ao_falhar=self.erro_banco,
+        )
+
+    def busca_digitada(self, e):
+        """Reagenda a busca a cada tecla: só roda depois de ATRASO_BUSCA sem digitar"""
+        with self.busca_trava:
+            if self.timer_busca is not None:
+                self.timer_busca.cancel()
+            self.timer_busca = threading.Timer(ATRASO_BUSCA, self.atualizar_views)
+            self.timer_busca.daemon = True
+            self.timer_busca.start()
+
+    def buscar_agora(self, e):
+        # Enter não espera o atraso da digitação
+        with self.busca_trava:
+            if self.timer_busca is not None:
+                self.timer_busca.cancel()
+                self.timer_busca = None
+        self.atualizar_views()
+
+    def _buscar_mes(self, ano, mes, tipo, categoria, termo):
+        # Lê o mês e, com busca, já deixa o resultado pronto no armazém; uma busca
+        # mais nova (chave "dashboard") cancela ou interrompe esta
+        self._carregar_mes(ano, mes)
+        if termo:
+            self._resultado_busca(ano, mes, tipo, categoria, termo)
+
+    def _resultado_busca(self, ano, mes, tipo, categoria, termo):
+        """Transações do mês que atendem à busca: guardadas, filtradas de uma busca anterior ou lidas do banco"""
+        resultado = self.armazem.busca(ano, mes, tipo, categoria, termo)
+        if resultado is not None:
+            return resultado
+
+        versao = self.armazem.versao(ano, mes)
+        anterior = self.armazem.busca_refinavel(ano, mes, tipo, categoria, termo)
+        resultado = db.filtrar_busca(anterior, termo) if anterior is not None else None
+        if resultado is not None:
+            completa = True
+        else:
+            # A busca já vem limitada (LIMITE_BUSCA) e, com FTS, ordenada por relevância
+            inicio, fim = db.limites_mes(ano, mes)
+            resultado = db.buscar_transacoes_periodo_db(
+                self.page, inicio, fim, tipo, categoria, termo_busca=termo
+            )
+            completa = len(resultado) < db.LIMITE_BUSCA
+        self.armazem.guardar_busca(ano, mes, tipo, categoria, termo, resultado, versao, completa)
+        return resultado
+
+    def _carregar_mes(self, ano, mes):
+        """Lê o mês do banco para o armazém, se ainda não estiver lá"""
+        while not self.armazem.carregado(ano, mes):
+            versao = self.armazem.versao(ano, mes)
+            transacoes = db.buscar_transacoes_mes_db(self.page, ano, mes)
+            # Recusado se uma gravação mexeu no mês durante a leitura: lê de novo
+            self.armazem.carregar_mes(ano, mes, transacoes, versao)
+
+    def _exibir_mes(self, mes, termo):
+        with self.exibicao_trava:
+            # Uma leitura que terminou depois de o usuário trocar de mês ou de
+            # busca não sobrescreve a tela: o pedido novo já a exibiu (ou exibirá)
+            if (mes.year, mes.month) != (self.mes_selecionado.year, self.mes_selecionado.month):
+                return
+            if termo != self._termo_busca():
+                return
+            # Um único ResumoMes (calculado uma vez e guardado no armazém) alimenta cards e gráficos
+            resumo = self.armazem.resumo_mes(mes.year, mes.month)
+            if resumo is None:
+                self._agendar_mes(mes, termo)  # o mês saiu da memória antes de ser exibido
+                return
+            self.atualizar_resumo_inicio(resumo)
+            self.txt_mes_ano.value = f"{month_name[mes.month].capitalize()} {mes.year}"
+            self.atualizar_dashboard_view(mes, resumo, termo)
+            self.page.update()
+        self._buscar_vizinhos(mes)
+
+    def _buscar_vizinhos(self, mes):
+        """Carrega em segundo plano o mês anterior e o seguinte, para as setas do mes_selector responderem na hora"""
+        for deslocamento in (-1, 1):
+            indice = mes.year * 12 + mes.month - 1 + deslocamento
+            ano, mes_vizinho = divmod(indice, 12)
+            mes_vizinho += 1
+            if self.armazem.carregado(ano, mes_vizinho):
+                continue
+            # Uma chave por direção: navegar de novo cancela a busca que ficou para trás
+            self.executor.ler(
+                self._preparar_mes, ano, mes_vizinho,
+                chave=f"vizinho{deslocamento:+d}", ao_falhar=lambda ex: None,
+            )
+
+    def _preparar_mes(self, ano, mes):
+        # Deixa o mês e o seu resumo prontos no armazém
+        self._carregar_mes(ano, mes)
+        self.armazem.resumo_mes(ano, mes)
+
+    def aplicar_alteracao(self, meses):
+        """Depois de um delta no armazém, refaz a tela só se o mês exibido foi afetado"""
+        mes = self.mes_selecionado
+        if (mes.year, mes.month) in meses:
+            self.atualizar_views()
 
-        self.atualizar_resumo_inicio(transacoes_do_mes)
-        self.txt_mes_ano.value = f"{month_name[self.mes_selecionado.month].capitalize()} {self.mes_selecionado.year}"
-        self.atualizar_dashboard_view(transacoes_do_mes)
+    def erro_banco(self, ex):
+        print(f"ERRO NO BANCO: {traceback.format_exc()}")
+        self.page.snack_bar = ft.SnackBar(ft.Text(f"Erro ao acessar os dados: {ex}"), bgcolor="red")
+        self.page.snack_bar.open = True
         self.page.update()
 
     # =============================================================================
     # MÉTODOS DE INTERFACE - RESUMO E DASHBOARD
     # =============================================================================
 
-    def atualizar_resumo_inicio(self, transacoes):
-        total_receitas = sum(float(t["valor"]) for t in transacoes if t["tipo"] == "Receita")
-        total_despesas = sum(float(t["valor"]) for t in transacoes if t["tipo"] == "Despesa")
-        saldo = total_receitas - total_despesas
+    def atualizar_resumo_inicio(self, resumo):
+        total_receitas = resumo.total_por_tipo["Receita"]
+        total_despesas = resumo.total_por_tipo["Despesa"]
+        saldo = resumo.saldo
 
         self.txt_total_receitas.value = f"R$ {total_receitas:,.2f}"
         self.txt_total_despesas.value = f"R$ {total_despesas:,.2f}"
@@ -711,23 +899,31 @@ class FinancialApp:
 
         self.filtro_dashboard.selected_index = 0
         self.filtro_subcategoria_dashboard.value = "Todas"
+        # Um mês já visitado vem direto do balde (ano, mes) do armazém, sem banco
         self.atualizar_views()
 
-    def atualizar_dashboard_view(self, transacoes):
+    def _filtros_historico(self):
+        """(tipo, categoria) do histórico conforme a aba e a subcategoria escolhidas"""
+        if self.filtro_dashboard.selected_index == 0:
+            return None, None
+        tipo = "Receita" if self.filtro_dashboard.selected_index == 1 else "Despesa"
+        subcategoria = self.filtro_subcategoria_dashboard.value
+        return tipo, None if subcategoria == "Todas" else subcategoria
+
+    def atualizar_dashboard_view(self, mes, resumo, termo=None):
         filtro_selecionado = self.filtro_dashboard.selected_index
         self.filtro_subcategoria_dashboard.visible = False
 
         if filtro_selecionado == 0:  # Visão Geral
-            transacoes_para_exibir = transacoes
-            self.gerar_grafico_geral(transacoes)
+            self.atualizar_historico(mes, termo=termo)
+            self.gerar_grafico_geral(resumo)
             self.card_resumo_dashboard_geral.visible = True
             self.card_resumo_dashboard_filtrado.visible = False
         else:  # Receitas ou Despesas
             tipo_filtro = "Receita" if filtro_selecionado == 1 else "Despesa"
 
-            categorias_do_tipo = sorted(list(set([
-                t["categoria"] for t in transacoes if t["tipo"] == tipo_filtro
-            ])))
+            dados_por_categoria = resumo.total_por_categoria.get(tipo_filtro, {})
+            categorias_do_tipo = resumo.categorias(tipo_filtro)
             
             if categorias_do_tipo:
                 self.filtro_subcategoria_dashboard.visible = True
@@ -738,22 +934,18 @@ class FinancialApp:
                 if self.filtro_subcategoria_dashboard.value not in [opt.key for opt in opcoes_filtro]:
                     self.filtro_subcategoria_dashboard.value = "Todas"
 
-            transacoes_do_tipo = [t for t in transacoes if t["tipo"] == tipo_filtro]
             subcategoria_selecionada = self.filtro_subcategoria_dashboard.value
+            categoria_historico = None if subcategoria_selecionada == "Todas" else subcategoria_selecionada
+            self.atualizar_historico(mes, tipo_filtro, categoria_historico, termo)
 
-            if subcategoria_selecionada == "Todas":
-                transacoes_para_exibir = transacoes_do_tipo
-            else:
-                transacoes_para_exibir = [
-                    t for t in transacoes_do_tipo
-                    if t["categoria"] == subcategoria_selecionada
-                ]
-
-            self.gerar_grafico_por_tipo(transacoes_do_tipo, tipo_filtro)
+            self.gerar_grafico_por_tipo(resumo, tipo_filtro)
             self.card_resumo_dashboard_geral.visible = False
             self.card_resumo_dashboard_filtrado.visible = True
 
-            total_filtrado = sum(float(t["valor"]) for t in transacoes_para_exibir)
+            if subcategoria_selecionada == "Todas":
+                total_filtrado = resumo.total_por_tipo[tipo_filtro]
+            else:
+                total_filtrado = dados_por_categoria.get(subcategoria_selecionada, 0.0)
 
             if subcategoria_selecionada == "Todas":
                 self.txt_resumo_filtrado_titulo.value = f"Total de {tipo_filtro}s"
@@ -763,11 +955,10 @@ class FinancialApp:
             self.txt_resumo_filtrado_valor.value = f"R$ {total_filtrado:,.2f}"
             self.txt_resumo_filtrado_valor.color = "green" if tipo_filtro == "Receita" else "red"
 
-        self.atualizar_historico(transacoes_para_exibir)
 
-        total_gasto = sum(float(t["valor"]) for t in transacoes if t["tipo"] == "Despesa")
-        total_ganho = sum(float(t["valor"]) for t in transacoes if t["tipo"] == "Receita")
-        lucro = total_ganho - total_gasto
+        total_gasto = resumo.total_por_tipo["Despesa"]
+        total_ganho = resumo.total_por_tipo["Receita"]
+        lucro = resumo.saldo
 
         self.txt_total_gasto_mes.value = f"R$ {total_gasto:,.2f}"
         self.txt_total_ganho_mes.value = f"R$ {total_ganho:,.2f}"
@@ -791,12 +982,12 @@ class FinancialApp:
     # MÉTODOS DE GRÁFICOS
     # =============================================================================
 
-    def gerar_grafico_geral(self, transacoes):
+    def gerar_grafico_geral(self, resumo):
         self.card_grafico_titulo.value = "Receitas x Despesas"
         self.grafico_legenda.controls.clear()
         
-        total_receitas = sum(float(t["valor"]) for t in transacoes if t["tipo"] == "Receita")
-        total_despesas = sum(float(t["valor"]) for t in transacoes if t["tipo"] == "Despesa")
+        total_receitas = resumo.total_por_tipo["Receita"]
+        total_despesas = resumo.total_por_tipo["Despesa"]
 
         soma_total = total_receitas + total_despesas
         if soma_total == 0:
@@ -832,21 +1023,18 @@ class FinancialApp:
                 ])
             )
 
-    def gerar_grafico_por_tipo(self, transacoes, tipo):
+    def gerar_grafico_por_tipo(self, resumo, tipo):
         self.card_grafico_titulo.value = f"Composição de {tipo}s"
         self.grafico_legenda.controls.clear()
 
-        if not transacoes:
+        dados_por_categoria = resumo.total_por_categoria.get(tipo, {})
+        if not dados_por_categoria:
             self.card_grafico.visible = False
             return
 
         self.card_grafico.visible = True
 
-        total_tipo = sum(float(t["valor"]) for t in transacoes)
-
-        dados_por_categoria = {}
-        for t in transacoes:
-            dados_por_categoria[t["categoria"]] = dados_por_categoria.get(t["categoria"], 0) + float(t["valor"])
+        total_tipo = resumo.total_por_tipo[tipo]
 
         if tipo == "Receita":
             cores = itertools.cycle(["green", "orange", "#36A2EB", "#4BC0C0", "#9966FF"])
@@ -877,12 +1065,59 @@ class FinancialApp:
 
         self.grafico_pizza.sections = chart_sections
 
-    def atualizar_historico(self, transacoes):
-        self.historico_container.controls.clear()
-        if not transacoes:
-            self.historico_container.controls.append(
-                ft.Text("Nenhuma transação encontrada para este filtro.", text_align=ft.TextAlign.CENTER)
-            )
+    def atualizar_historico(self, data_mes, tipo=None, categoria=None, termo=None):
+        """Recomeça o histórico do mês exibido: a primeira página agora, as demais ao rolar a lista."""
+        ano, mes = data_mes.year, data_mes.month
+        with self.historico_trava:
+            self.historico_container.controls.clear()
+            self.historico_exibidas = 0
+
+            if termo:
+                self.historico_linhas = self._resultado_busca(ano, mes, tipo, categoria, termo)
+            else:
+                self.historico_linhas = self.armazem.transacoes_mes(ano, mes, tipo, categoria)
+                if self.historico_linhas is None:
+                    # O mês saiu da memória: fica vazio até a leitura agendada exibi-lo de novo
+                    self.historico_linhas = ()
+                    self._agendar_mes(data_mes, termo)
+            self._carregar_pagina_historico()
+
+            if not self.historico_container.controls:
+                self.historico_container.controls.append(
+                    ft.Text("Nenhuma transação encontrada para este filtro.", text_align=ft.TextAlign.CENTER)
+                )
+
+    def _carregar_pagina_historico(self):
+        """Acrescenta a próxima página ao histórico (chamar com historico_trava adquirida)"""
+        fim = self.historico_exibidas + db.TAMANHO_PAGINA_HISTORICO
+        pagina = self.historico_linhas[self.historico_exibidas:fim]
+        self.historico_exibidas += len(pagina)
+        self.historico_tem_mais = self.historico_exibidas < len(self.historico_linhas)
+
+        if self.btn_carregar_mais in self.historico_container.controls:
+            self.historico_container.controls.remove(self.btn_carregar_mais)
+        self.adicionar_linhas_historico(pagina)
+        if self.historico_tem_mais:
+            self.historico_container.controls.append(self.btn_carregar_mais)
+
+    def carregar_mais_historico(self, e=None):
+        # Rolagem e clique podem chegar juntos: quem não pegar a trava desiste
+        if not self.historico_trava.acquire(blocking=False):
+            return
+        try:
+            if not self.historico_tem_mais:
+                return
+            self._carregar_pagina_historico()
+        finally:
+            self.historico_trava.release()
+        self.page.update()
+
+    def historico_rolado(self, e):
+        # Busca a próxima página quando a rolagem chega perto do fim da lista
+        if e.max_scroll_extent is not None and e.pixels >= e.max_scroll_extent - 200:
+            self.carregar_mais_historico()
+
+    def adicionar_linhas_historico(self, transacoes):
         for t in transacoes:
             self.historico_container.controls.append(
                 ft.Row(
@@ -890,8 +1125,8 @@ class FinancialApp:
                     controls=[
                         ft.Column(
                             controls=[
-                                ft.Text(f"{t['descricao']} ({t['categoria']})", weight=ft.FontWeight.BOLD),
-                                ft.Text(t["data"], color="grey", size=12),
+                                ft.Text(f"{t.descricao} ({t.categoria})", weight=ft.FontWeight.BOLD),
+                                ft.Text(formatar_data(t.data), color="grey", size=12),
                             ],
                             expand=True,
                             spacing=1,
@@ -900,8 +1135,8 @@ class FinancialApp:
                             spacing=0,
                             controls=[
                                 ft.Text(
-                                    f"{'+' if t['tipo'] == 'Receita' else '-'} R$ {float(t['valor']):,.2f}",
-                                    color="green" if t["tipo"] == "Receita" else "red",
+                                    f"{'+' if t.tipo == 'Receita' else '-'} R$ {t.valor:,.2f}",
+                                    color="green" if t.tipo == "Receita" else "red",
                                     weight=ft.FontWeight.BOLD,
                                 ),
                                 ft.IconButton(
@@ -950,8 +1185,8 @@ class FinancialApp:
             return
 
         # Validar categoria
-        categorias_do_tipo = [cat['nome'] for cat in db.buscar_categorias_db(self.page, tipo=tipo)]
-        if categorias_do_tipo and self.dd_categoria.value not in categorias_do_tipo:
+        registro = db.registro_categorias_db(self.page)
+        if registro.nomes_por_tipo.get(tipo) and registro.tipo_por_nome.get(self.dd_categoria.value) != tipo:
             self.page.snack_bar = ft.SnackBar(
                 ft.Text(f"A categoria '{self.dd_categoria.value}' não pertence a {tipo}. Selecione outra ou crie em Ajustes."),
                 bgcolor="orange",
@@ -960,28 +1195,146 @@ class FinancialApp:
             self.page.update()
             return
 
-        db.adicionar_transacao_db(
-            self.page, tipo, self.txt_descricao.value, valor, 
-            self.dd_categoria.value, self.txt_data_selecionada.value
+        nova = (tipo, self.txt_descricao.value, valor, self.dd_categoria.value, self.txt_data_selecionada.value)
+        self.gravar_nova_transacao(nova, verificar_duplicata=True)
+
+    def gravar_nova_transacao(self, nova, verificar_duplicata=False):
+        """Grava a transação (tipo, descricao, valor, categoria, data) e limpa o formulário.
+
+        Com verificar_duplicata, a conferência e a gravação são um único trabalho
+        na thread de escrita: dois toques rápidos em Adicionar não gravam duas
+        vezes, o segundo encontra o primeiro e pede confirmação.
+        """
+        def concluir(transacao):
+            if transacao is None:
+                self.abrir_dialogo_duplicata(nova)
+            else:
+                self.transacao_gravada(transacao)
+
+        self.executor.gravar(
+            self._gravar_transacao, nova, verificar_duplicata,
+            ao_concluir=concluir,
+            ao_falhar=self.erro_banco,
         )
 
         self.txt_descricao.value, self.txt_valor.value, self.dd_categoria.value = "", "", None
         self.txt_data_selecionada.value = "Selecione uma data..."
+        self.page.update()
+
+    def _gravar_transacao(self, nova, verificar_duplicata=False):
+        # Roda na thread de escrita; devolve a linha gravada para aplicar o delta (None se era duplicata)
+        id = db.adicionar_transacao_db(self.page, *nova, ignorar_duplicada=verificar_duplicata)
+        if id is None:
+            return None
+        return db.buscar_transacao_db(self.page, id)
+
+    def transacao_gravada(self, transacao):
         self.atualizar_timestamp_permanente()
-        self.carregar_dados_iniciais()
+        self.aplicar_alteracao(self.armazem.inserir(transacao))
+
+    def abrir_dialogo_duplicata(self, nova):
+        """Pede confirmação antes de gravar uma transação igual a uma já existente"""
+        tipo, descricao, valor, _categoria, data = nova
+
+        def confirmar(e):
+            self.page.close(dialogo)
+            self.gravar_nova_transacao(nova)
+
+        def cancelar(e):
+            # O formulário já foi limpo ao enviar: devolve os dados para o usuário corrigir
+            self.page.close(dialogo)
+            self.txt_descricao.value, self.dd_categoria.value = descricao, _categoria
+            self.txt_valor.value = str(valor)
+            self.txt_data_selecionada.value = data
+            self.page.update()
+
+        dialogo = ft.AlertDialog(
+            modal=True,
+            title=ft.Text("Transação duplicada?"),
+            content=ft.Text(
+                f"Já existe uma {tipo.lower()} \"{descricao}\" de "
+                f"R$ {valor:,.2f} em {data}. Adicionar mesmo assim?"
+            ),
+            actions=[
+                ft.TextButton("Cancelar", on_click=cancelar),
+                ft.TextButton("Adicionar", on_click=confirmar),
+            ],
+            actions_alignment=ft.MainAxisAlignment.END,
+        )
+        self.page.open(dialogo)
+
+    def abrir_diagnostico(self, e):
+        """Mostra as estatísticas das funções do banco coletadas pelo módulo diagnostico"""
+        tabela = ft.DataTable(
+            columns=[
+                ft.DataColumn(ft.Text("Função")),
+                ft.DataColumn(ft.Text("Chamadas"), numeric=True),
+                ft.DataColumn(ft.Text("Média (ms)"), numeric=True),
+                ft.DataColumn(ft.Text("Máx (ms)"), numeric=True),
+                ft.DataColumn(ft.Text("Linhas"), numeric=True),
+                ft.DataColumn(ft.Text("Lentas"), numeric=True),
+            ],
+            column_spacing=15,
+        )
+        rodape = ft.Text("", size=12, color="grey")
+
+        def preencher():
+            tabela.rows = [
+                ft.DataRow(cells=[
+                    ft.DataCell(ft.Text(est["funcao"], size=12)),
+                    ft.DataCell(ft.Text(str(est["chamadas"]))),
+                    ft.DataCell(ft.Text(f"{est['tempo_medio_ms']:.2f}")),
+                    ft.DataCell(ft.Text(f"{est['tempo_max_ms']:.2f}")),
+                    ft.DataCell(ft.Text(str(est["linhas"]))),
+                    ft.DataCell(ft.Text(str(est["lentas"]), color="red" if est["lentas"] else None)),
+                ])
+                for est in diagnostico.estatisticas()
+            ]
+            rodape.value = (
+                f"Consultas acima de {diagnostico.limite_lenta_ms:.0f} ms são registradas "
+                f"em {diagnostico.ARQUIVO_LOG}."
+            )
+
+        def zerar(e):
+            diagnostico.zerar()
+            preencher()
+            self.page.update()
+
+        def exportar(e):
+            diagnostico.exportar()
+            self.page.snack_bar = ft.SnackBar(ft.Text(f"Resumo gravado em {diagnostico.ARQUIVO_LOG}"))
+            self.page.snack_bar.open = True
+            self.page.update()
+
+        preencher()
+        dialogo = ft.AlertDialog(
+            title=ft.Text("Desempenho do Banco"),
+            content=ft.Column([
+                ft.Row([tabela], scroll=ft.ScrollMode.AUTO),
+                rodape,
+            ], scroll=ft.ScrollMode.AUTO, height=400, width=650),
+            actions=[
+                ft.TextButton("Zerar", on_click=zerar),
+                ft.TextButton("Exportar para Log", on_click=exportar),
+                ft.TextButton("Fechar", on_click=lambda e: self.page.close(dialogo)),
+            ],
+            actions_alignment=ft.MainAxisAlignment.END,
+        )
+        self.page.open(dialogo)
 
     def iniciar_edicao(self, transacao):
         self.card_title.value = "Editar Transação"
-        self.id_em_edicao.value = transacao["id"]
+        self.id_em_edicao.value = transacao.id
+        self.transacao_em_edicao = transacao
         self.linha_botoes_adicionar.visible = False
         self.linha_botoes_edicao.visible = True
         self.radio_group_tipo_edicao.visible = True
 
-        self.radio_group_tipo_edicao.value = transacao["tipo"]
-        self.txt_descricao.value = transacao["descricao"]
-        self.txt_valor.value = str(transacao["valor"])
-        self.dd_categoria.value = transacao["categoria"]
-        self.txt_data_selecionada.value = transacao["data"]
+        self.radio_group_tipo_edicao.value = transacao.tipo
+        self.txt_descricao.value = transacao.descricao
+        self.txt_valor.value = str(transacao.valor)
+        self.dd_categoria.value = transacao.categoria
+        self.txt_data_selecionada.value = formatar_data(transacao.data)
         self.page.update()
 
     def salvar_edicao(self, e):
@@ -1001,8 +1354,8 @@ class FinancialApp:
 
         # Validar categoria na edição
         tipo = self.radio_group_tipo_edicao.value
-        categorias_do_tipo = [cat['nome'] for cat in db.buscar_categorias_db(self.page, tipo=tipo)]
-        if categorias_do_tipo and self.dd_categoria.value not in categorias_do_tipo:
+        registro = db.registro_categorias_db(self.page)
+        if registro.nomes_por_tipo.get(tipo) and registro.tipo_por_nome.get(self.dd_categoria.value) != tipo:
             self.page.snack_bar = ft.SnackBar(
                 ft.Text(f"A categoria '{self.dd_categoria.value}' não pertence a {tipo}. Selecione outra ou ajuste em Ajustes."),
                 bgcolor="orange",
@@ -1011,17 +1364,23 @@ class FinancialApp:
             self.page.update()
             return
 
-        db.update_transacao_db(
-            self.page, id=int(self.id_em_edicao.value), tipo=tipo,
-            descricao=self.txt_descricao.value, valor=valor,
-            categoria=self.dd_categoria.value, data=self.txt_data_selecionada.value
+        antiga = self.transacao_em_edicao
+        self.executor.gravar(
+            self._atualizar_transacao, antiga.id, tipo, self.txt_descricao.value, valor,
+            self.dd_categoria.value, self.txt_data_selecionada.value,
+            ao_concluir=lambda nova: self.aplicar_alteracao(self.armazem.atualizar(antiga, nova)),
+            ao_falhar=self.erro_banco,
         )
         self.cancelar_edicao(None)
-        self.carregar_dados_iniciais()
+
+    def _atualizar_transacao(self, id, tipo, descricao, valor, categoria, data):
+        db.update_transacao_db(self.page, id, tipo, descricao, valor, categoria, data)
+        return db.buscar_transacao_db(self.page, id)
 
     def cancelar_edicao(self, e):
         self.card_title.value = "Nova Transação"
         self.id_em_edicao.value = None
+        self.transacao_em_edicao = None
         self.linha_botoes_adicionar.visible = True
         self.linha_botoes_edicao.visible = False
         self.radio_group_tipo_edicao.visible = False
@@ -1031,8 +1390,11 @@ class FinancialApp:
         self.page.update()
 
     def deletar_transacao(self, transacao_a_deletar):
-        db.deletar_transacao_db(self.page, transacao_a_deletar["id"])
-        self.carregar_dados_iniciais()
+        self.executor.gravar(
+            db.deletar_transacao_db, self.page, transacao_a_deletar.id,
+            ao_concluir=lambda _: self.aplicar_alteracao(self.armazem.remover(transacao_a_deletar)),
+            ao_falhar=self.erro_banco,
+        )
 
     def abrir_dialogo_confirmacao(self, transacao):
         self.dialogo_confirmacao.data = transacao
@@ -1046,11 +1408,13 @@ class FinancialApp:
         self.page.close(self.dialogo_confirmacao)
 
     def atualizar_opcoes_categoria(self, e):
-        """Força a atualização das opções do dropdown de categoria ao focar."""
+        """Atualiza as opções do dropdown de categoria ao focar, se as categorias mudaram."""
         try:
-            categorias_db = db.buscar_categorias_db(self.page)
-            opcoes = [ft.dropdown.Option(cat['nome']) for cat in categorias_db]
-            self.dd_categoria.options = opcoes
+            registro = db.registro_categorias_db(self.page)
+            if registro.versao == self.versao_opcoes_categoria:
+                return
+            self.versao_opcoes_categoria = registro.versao
+            self.dd_categoria.options = [ft.dropdown.Option(cat.nome) for cat in registro.categorias]
             self.page.update()
         except Exception as ex:
             print(f"ERRO AO ATUALIZAR OPÇÕES: {ex}")
@@ -1109,23 +1473,28 @@ class FinancialApp:
     # =============================================================================
 
     def carregar_e_exibir_categorias(self):
+        registro = db.registro_categorias_db(self.page)
+        if registro.versao == self.versao_lista_categorias:
+            return  # a lista exibida já está atual
+        self.versao_lista_categorias = registro.versao
+
         self.lista_categorias_view.controls.clear()
-        categorias_db = db.buscar_categorias_db(self.page)
+        categorias_db = registro.categorias
         if not categorias_db:
             self.lista_categorias_view.controls.append(ft.Text("Nenhuma categoria cadastrada."))
         else:
             for categoria in categorias_db:
                 self.lista_categorias_view.controls.append(
                     ft.ListTile(
-                        title=ft.Text(categoria['nome']),
+                        title=ft.Text(categoria.nome),
                         subtitle=ft.Text(
-                            categoria['tipo'], 
-                            color="green" if categoria['tipo'] == 'Receita' else 'orange'
+                            categoria.tipo, 
+                            color="green" if categoria.tipo == 'Receita' else 'orange'
                         ),
                         trailing=ft.IconButton(
                             icon=ft.Icons.DELETE_OUTLINE,
                             icon_color="red",
-                            data=categoria['id'],
+                            data=categoria.id,
                             on_click=self.confirmar_delecao_categoria,
                         )
                     )
@@ -1147,17 +1516,23 @@ class FinancialApp:
                 self.page.snack_bar.open = True
                 self.page.update()
                 return
-            try:
-                db.adicionar_categoria_db(self.page, nome, tipo)
-                self.page.close(dialogo)
-                self.carregar_e_exibir_categorias()
-                self.page.snack_bar = ft.SnackBar(ft.Text(f"Categoria '{nome}' adicionada!"), bgcolor="green")
-                self.page.snack_bar.open = True
-                self.page.update()
-            except Exception:
-                self.page.snack_bar = ft.SnackBar(ft.Text("Erro: Categoria já existe."), bgcolor="red")
-                self.page.snack_bar.open = True
-                self.page.update()
+            self.executor.gravar(
+                db.adicionar_categoria_db, self.page, nome, tipo,
+                ao_concluir=lambda _: categoria_adicionada(nome),
+                ao_falhar=erro_categoria,
+            )
+
+        def categoria_adicionada(nome):
+            self.page.close(dialogo)
+            self.carregar_e_exibir_categorias()
+            self.page.snack_bar = ft.SnackBar(ft.Text(f"Categoria '{nome}' adicionada!"), bgcolor="green")
+            self.page.snack_bar.open = True
+            self.page.update()
+
+        def erro_categoria(ex):
+            self.page.snack_bar = ft.SnackBar(ft.Text("Erro: Categoria já existe."), bgcolor="red")
+            self.page.snack_bar.open = True
+            self.page.update()
 
         dialogo = ft.AlertDialog(
             modal=True,
@@ -1175,9 +1550,12 @@ class FinancialApp:
         categoria_id = e.control.data
         
         def deletar_click(ev):
-            db.deletar_categoria_db(self.page, categoria_id)
             self.page.close(dlg_confirm)
-            self.carregar_e_exibir_categorias()
+            self.executor.gravar(
+                db.deletar_categoria_db, self.page, categoria_id,
+                ao_concluir=lambda _: self.carregar_e_exibir_categorias(),
+                ao_falhar=self.erro_banco,
+            )
 
         dlg_confirm = ft.AlertDialog(
             modal=True,
@@ -1193,14 +1571,15 @@ class FinancialApp:
     def tipo_relatorio_changed(self, e):
         """Atualiza as opções de categoria na tela de relatórios."""
         tipo = self.filtro_tipo_relatorio.value
+        registro = db.registro_categorias_db(self.page)
         if tipo == "Todas":
-            categorias_db = db.buscar_categorias_db(self.page)
+            nomes = [cat.nome for cat in registro.categorias]
             self.filtro_categoria_relatorio.disabled = False
         else:
-            categorias_db = db.buscar_categorias_db(self.page, tipo=tipo)
+            nomes = registro.nomes_por_tipo.get(tipo, ())
             self.filtro_categoria_relatorio.disabled = False
 
-        opcoes = [ft.dropdown.Option("Todas")] + [ft.dropdown.Option(cat['nome']) for cat in categorias_db]
+        opcoes = [ft.dropdown.Option("Todas")] + [ft.dropdown.Option(nome) for nome in nomes]
         self.filtro_categoria_relatorio.options = opcoes
         self.filtro_categoria_relatorio.value = "Todas"
         self.page.update()
@@ -1210,7 +1589,7 @@ class FinancialApp:
     # =============================================================================
 
     def atualizar_cofre_inicio(self):
-        total = sum(float(m["valor_atual"]) for m in self.todas_metas)
+        total = sum(m.valor_atual for m in self.todas_metas)
         self.txt_cofre_total.value = f"R$ {total:,.2f}"
         self.page.update()
 
@@ -1231,8 +1610,8 @@ class FinancialApp:
             )
         else:
             for meta in self.todas_metas:
-                objetivo = float(meta["valor_objetivo"])
-                atual = float(meta["valor_atual"])
+                objetivo = meta.valor_objetivo
+                atual = meta.valor_atual
                 progresso = (atual / objetivo) if objetivo > 0 else 0.0
                 progresso = max(0.0, min(1.0, progresso))
 
@@ -1247,7 +1626,7 @@ class FinancialApp:
                                     ft.Row(
                                         alignment=ft.MainAxisAlignment.SPACE_BETWEEN,
                                         controls=[
-                                            ft.Text(meta["nome"], size=18, weight=ft.FontWeight.BOLD),
+                                            ft.Text(meta.nome, size=18, weight=ft.FontWeight.BOLD),
                                             ft.Text(f"{progresso*100:,.0f}%", size=14),
                                         ],
                                     ),
@@ -1282,10 +1661,23 @@ class FinancialApp:
         self.page.update()
 
     def carregar_metas(self):
-        self.todas_metas = db.buscar_metas_db(self.page)
+        self.executor.ler(
+            db.buscar_metas_db, self.page,
+            chave="metas", ao_concluir=self.exibir_metas, ao_falhar=self.erro_banco,
+        )
+
+    def exibir_metas(self, metas):
+        self.todas_metas = metas
         self.atualizar_carteira()
         self.atualizar_cofre_inicio()
 
+    def meta_movimentada(self, texto):
+        self.txt_ultima_atualizacao.value = texto
+        self.carregar_metas()  # Recarrega as metas para a view 'Carteira'
+        # A transação do depósito/retirada é de hoje: só esse mês é relido
+        hoje = datetime.now()
+        self.aplicar_alteracao(self.armazem.descartar_mes(hoje.year, hoje.month))
+
     def abrir_dialogo_nova_meta(self, e):
         nome = ft.TextField(label="Nome da Meta")
         valor_objetivo = ft.TextField(label="Valor Objetivo (R$)", keyboard_type=ft.KeyboardType.NUMBER)
@@ -1300,17 +1692,21 @@ class FinancialApp:
                 alvo = float(valor_objetivo.value)
                 if alvo <= 0:
                     raise ValueError
-                db.adicionar_meta_db(self.page, nome.value, alvo)
+                self.executor.gravar(
+                    db.adicionar_meta_db, self.page, nome.value, alvo,
+                    ao_concluir=lambda _: self.carregar_metas(),
+                    ao_falhar=erro_meta,
+                )
                 self.page.close(dialogo)
-                self.carregar_metas()
             except ValueError:
                 self.page.snack_bar = ft.SnackBar(ft.Text("Valor objetivo inválido."), bgcolor="red")
                 self.page.snack_bar.open = True
                 self.page.update()
-            except Exception:
-                self.page.snack_bar = ft.SnackBar(ft.Text("Erro ao salvar meta."), bgcolor="red")
-                self.page.snack_bar.open = True
-                self.page.update()
+
+        def erro_meta(ex):
+            self.page.snack_bar = ft.SnackBar(ft.Text("Erro ao salvar meta."), bgcolor="red")
+            self.page.snack_bar.open = True
+            self.page.update()
 
         dialogo = ft.AlertDialog(
             modal=True,
@@ -1333,46 +1729,29 @@ class FinancialApp:
                 if v <= 0:
                     raise ValueError
                 
-                # --- Lógica principal ---
-                
-                # 1. Calcula o novo valor da meta
-                novo_valor_meta = float(meta["valor_atual"]) + v
-                objetivo = float(meta["valor_objetivo"])
-                if objetivo > 0:
-                    novo_valor_meta = min(novo_valor_meta, objetivo)
-                
-                # 2. Atualiza o valor na tabela de metas
-                db.atualizar_valor_meta_db(self.page, meta["id"], novo_valor_meta)
-
-                # 3. CRIA A TRANSAÇÃO DE DESPESA CORRESPONDENTE
-                db.adicionar_transacao_db(
-                    self.page,
-                    tipo="Despesa",
-                    descricao=f"Depósito na meta: {meta['nome']}",
-                    valor=v,
-                    categoria="Depósito em Meta",  # Certifique-se que essa categoria existe!
-                    data=datetime.now().strftime("%d/%m/%Y")
+                # Meta, transação de despesa e timestamp gravados num único commit
+                texto = self.texto_timestamp()
+                self.executor.gravar(
+                    db.movimentar_meta_db, self.page, meta.id, v, ultima_alteracao=texto,
+                    ao_concluir=lambda _: self.meta_movimentada(texto),
+                    ao_falhar=erro_deposito,
                 )
-                
-                # 4. Recarrega todos os dados para atualizar a UI
-                self.atualizar_timestamp_permanente()
                 self.page.close(dialogo)
-                self.carregar_metas() # Recarrega as metas para a view 'Carteira'
-                self.carregar_dados_iniciais() # Recarrega as transações e atualiza o SALDO PRINCIPAL
 
             except ValueError:
                 self.page.snack_bar = ft.SnackBar(ft.Text("Informe um valor positivo válido."), bgcolor="red")
                 self.page.snack_bar.open = True
                 self.page.update()
-            except Exception as e:
-                print(f"Erro ao depositar: {e}")
-                self.page.snack_bar = ft.SnackBar(ft.Text("Erro ao processar o depósito."), bgcolor="red")
-                self.page.snack_bar.open = True
-                self.page.update()
+
+        def erro_deposito(ex):
+            print(f"Erro ao depositar: {ex}")
+            self.page.snack_bar = ft.SnackBar(ft.Text("Erro ao processar o depósito."), bgcolor="red")
+            self.page.snack_bar.open = True
+            self.page.update()
 
         dialogo = ft.AlertDialog(
             modal=True,
-            title=ft.Text(f"Depositar em {meta['nome']}"),
+            title=ft.Text(f"Depositar em {meta.nome}"),
             content=valor,
             actions=[
                 ft.TextButton("Cancelar", on_click=lambda ev: self.page.close(dialogo)),
@@ -1388,47 +1767,34 @@ class FinancialApp:
         def confirmar(ev):
             try:
                 v = float(valor.value)
-                if v <= 0 or v > float(meta["valor_atual"]):
+                if v <= 0 or v > meta.valor_atual:
                     raise ValueError("Valor inválido ou maior que o saldo da meta.")
 
-                # --- Lógica principal ---
-
-                # 1. Calcula o novo valor da meta
-                novo_valor_meta = max(0.0, float(meta["valor_atual"]) - v)
-                
-                # 2. Atualiza o valor na tabela de metas
-                db.atualizar_valor_meta_db(self.page, meta["id"], novo_valor_meta)
-
-                # 3. CRIA A TRANSAÇÃO DE RECEITA CORRESPONDENTE
-                db.adicionar_transacao_db(
-                    self.page,
-                    tipo="Receita",
-                    descricao=f"Retirada da meta: {meta['nome']}",
-                    valor=v,
-                    categoria="Retirada de Meta", # Certifique-se que essa categoria existe!
-                    data=datetime.now().strftime("%d/%m/%Y")
+                # Meta, transação de receita e timestamp gravados num único commit
+                texto = self.texto_timestamp()
+                self.executor.gravar(
+                    db.movimentar_meta_db, self.page, meta.id, -v, ultima_alteracao=texto,
+                    ao_concluir=lambda _: self.meta_movimentada(texto),
+                    ao_falhar=erro_retirada,
                 )
-
-                # 4. Recarrega todos os dados para atualizar a UI
-                self.atualizar_timestamp_permanente()
                 self.page.close(dialogo)
-                self.carregar_metas() # Recarrega as metas para a view 'Carteira'
-                self.carregar_dados_iniciais() # Recarrega as transações e atualiza o SALDO PRINCIPAL
 
             except ValueError as e:
+                erro_retirada(e)
+
+        def erro_retirada(e):
+            if isinstance(e, ValueError):
                 error_message = str(e) if str(e) else "Informe um valor válido e menor que o saldo da meta."
-                self.page.snack_bar = ft.SnackBar(ft.Text(error_message), bgcolor="red")
-                self.page.snack_bar.open = True
-                self.page.update()
-            except Exception as e:
+            else:
                 print(f"Erro ao retirar: {e}")
-                self.page.snack_bar = ft.SnackBar(ft.Text("Erro ao processar a retirada."), bgcolor="red")
-                self.page.snack_bar.open = True
-                self.page.update()
+                error_message = "Erro ao processar a retirada."
+            self.page.snack_bar = ft.SnackBar(ft.Text(error_message), bgcolor="red")
+            self.page.snack_bar.open = True
+            self.page.update()
 
         dialogo = ft.AlertDialog(
             modal=True,
-            title=ft.Text(f"Retirar de {meta['nome']}"),
+            title=ft.Text(f"Retirar de {meta.nome}"),
             content=valor,
             actions=[
                 ft.TextButton("Cancelar", on_click=lambda ev: self.page.close(dialogo)),
@@ -1440,16 +1806,17 @@ class FinancialApp:
 
     def abrir_dialogo_excluir_meta(self, meta):
         def confirmar(ev):
-            try:
-                db.deletar_meta_db(self.page, meta["id"])
-            finally:
-                self.page.close(dialogo)
-                self.carregar_metas()
+            self.page.close(dialogo)
+            self.executor.gravar(
+                db.deletar_meta_db, self.page, meta.id,
+                ao_concluir=lambda _: self.carregar_metas(),
+                ao_falhar=self.erro_banco,
+            )
 
         dialogo = ft.AlertDialog(
             modal=True,
             title=ft.Text("Excluir Meta"),
-            content=ft.Text(f"Tem certeza que deseja excluir a meta '{meta['nome']}'?"),
+            content=ft.Text(f"Tem certeza que deseja excluir a meta '{meta.nome}'?"),
             actions=[
                 ft.TextButton("Cancelar", on_click=lambda ev: self.page.close(dialogo)),
                 ft.TextButton("Excluir", on_click=confirmar),
@@ -1493,29 +1860,62 @@ class FinancialApp:
             self.page.update()
             return
 
-        # Arquivos temporários de gráfico
-        grafico_despesas_path = "grafico_despesas.png"
-        grafico_receitas_path = "grafico_receitas.png"
-        grafico_temp_path = "grafico_temp.png"
-        
         try:
-            # Filtragem dos dados
             data_inicio = datetime.strptime(self.data_inicio_relatorio.value, "%d/%m/%Y")
             data_fim = datetime.strptime(self.data_fim_relatorio.value, "%d/%m/%Y")
-            tipo_filtro = self.filtro_tipo_relatorio.value
-            cat_filtro = self.filtro_categoria_relatorio.value
+        except ValueError:
+            self._erro_relatorio_pdf()
+            return
+        tipo_filtro = self.filtro_tipo_relatorio.value
+        cat_filtro = self.filtro_categoria_relatorio.value
 
-            transacoes_no_periodo = [
-                t for t in self.todas_transacoes 
-                if data_inicio <= datetime.strptime(t['data'], "%d/%m/%Y") <= data_fim
-            ]
-            
-            transacoes_relatorio = transacoes_no_periodo
-            if tipo_filtro != "Todas":
-                transacoes_relatorio = [t for t in transacoes_relatorio if t['tipo'] == tipo_filtro]
-            if cat_filtro != "Todas":
-                transacoes_relatorio = [t for t in transacoes_relatorio if t['categoria'] == cat_filtro]
+        # As consultas vão para o leitor; o PDF é montado quando os dados chegam
+        self.executor.ler(
+            self._ler_dados_relatorio, data_inicio, data_fim, tipo_filtro, cat_filtro,
+            chave="relatorio",
+            ao_concluir=lambda dados: self._montar_relatorio_pdf(
+                e, data_inicio, data_fim, tipo_filtro, cat_filtro, dados
+            ),
+            ao_falhar=lambda ex: self._erro_relatorio_pdf(),
+        )
 
+    def _ler_dados_relatorio(self, data_inicio, data_fim, tipo_filtro, cat_filtro):
+        """Consultas do relatório: transações, totais por categoria e, com uma categoria, as estatísticas dela"""
+        dados = {
+            "transacoes": db.buscar_transacoes_periodo_db(
+                self.page, data_inicio, data_fim,
+                tipo=tipo_filtro if tipo_filtro != "Todas" else None,
+                categoria=cat_filtro if cat_filtro != "Todas" else None,
+            )
+        }
+        if not dados["transacoes"]:
+            return dados
+
+        # Totais por categoria lidos do resumo mensal
+        totais_categoria = db.totais_por_categoria_db(
+            self.page, data_inicio, data_fim,
+            tipo=tipo_filtro if tipo_filtro != "Todas" else None,
+        )
+        if cat_filtro != "Todas":
+            totais_categoria = [c for c in totais_categoria if c['categoria'] == cat_filtro]
+            tipo_categoria = totais_categoria[0]['tipo']
+            dados["estatisticas"] = next(
+                c for c in db.estatisticas_por_categoria_db(self.page, data_inicio, data_fim, tipo=tipo_categoria)
+                if c['categoria'] == cat_filtro
+            )
+            dados["total_do_tipo"] = db.totais_por_tipo_db(self.page, data_inicio, data_fim)[tipo_categoria]
+        dados["totais_categoria"] = totais_categoria
+        return dados
+
+    def _montar_relatorio_pdf(self, e, data_inicio, data_fim, tipo_filtro, cat_filtro, dados):
+        """Monta e salva o PDF com os dados lidos por _ler_dados_relatorio"""
+        # Arquivos temporários de gráfico
+        grafico_despesas_path = "grafico_despesas.png"
+        grafico_receitas_path = "grafico_receitas.png"
+        grafico_temp_path = "grafico_temp.png"
+        transacoes_relatorio = dados["transacoes"]
+
+        try:
             # Construção do PDF
             pdf = FPDF()
             pdf.add_page()
@@ -1550,18 +1950,10 @@ class FinancialApp:
                 pdf.set_font("DejaVu", "", 12)  # <<< CORRIGIDO (Itálico não foi carregado, usando normal)
                 pdf.cell(0, 10, "Nenhuma transação encontrada para os filtros selecionados.", 0, 1, "C")
             else:
-                # Análise dos dados (continua igual)
-                dados_despesas_cat = {
-                    c: sum(float(t['valor']) for t in transacoes_relatorio 
-                           if t['tipo'] == 'Despesa' and t['categoria'] == c) 
-                    for c in set(t['categoria'] for t in transacoes_relatorio if t['tipo'] == 'Despesa')
-                }
-                
-                dados_receitas_cat = {
-                    c: sum(float(t['valor']) for t in transacoes_relatorio 
-                           if t['tipo'] == 'Receita' and t['categoria'] == c) 
-                    for c in set(t['categoria'] for t in transacoes_relatorio if t['tipo'] == 'Receita')
-                }
+                # Análise dos dados
+                totais_categoria = dados["totais_categoria"]
+                dados_despesas_cat = {c['categoria']: c['total'] for c in totais_categoria if c['tipo'] == 'Despesa'}
+                dados_receitas_cat = {c['categoria']: c['total'] for c in totais_categoria if c['tipo'] == 'Receita'}
                 
                 # Título dinâmico
                 if cat_filtro != "Todas":
@@ -1578,7 +1970,10 @@ class FinancialApp:
 
                 # Gerar gráficos e análises conforme o tipo de relatório
                 if cat_filtro != "Todas":
-                    self._gerar_relatorio_categoria(pdf, transacoes_relatorio, transacoes_no_periodo, cat_filtro, tipo_filtro)
+                    self._gerar_relatorio_categoria(
+                        pdf, transacoes_relatorio, dados["estatisticas"], dados["total_do_tipo"],
+                        totais_categoria[0]['tipo'],
+                    )
                 elif tipo_filtro != "Todas":
                     dados_para_resumo = dados_receitas_cat if tipo_filtro == "Receita" else dados_despesas_cat
                     self._gerar_relatorio_tipo(pdf, dados_para_resumo, tipo_filtro, grafico_temp_path)
@@ -1639,21 +2034,8 @@ class FinancialApp:
             self.page.snack_bar = ft.SnackBar(ft.Text("Relatório PDF salvo com sucesso!"), bgcolor="green")
             self.page.snack_bar.open = True
         
-        except Exception as ex:
-            # (continua igual)
-            traceback_str = traceback.format_exc()
-            print(f"ERRO CRÍTICO AO GERAR PDF: {traceback_str}")
-            dlg_erro = ft.AlertDialog(
-                modal=True, 
-                title=ft.Text("Ocorreu um Erro ao Gerar o PDF"), 
-                content=ft.Column([
-                    ft.Text("Por favor, envie um print desta tela para o desenvolvedor."), 
-                    ft.TextField(value=traceback_str, multiline=True, read_only=True, filled=True)
-                ], tight=True, scroll=ft.ScrollMode.AUTO), 
-                actions=[ft.TextButton("Fechar", on_click=lambda _: self.page.close(dlg_erro))]
-            )
-            self.page.open(dlg_erro)
-            self.page.update()
+        except Exception:
+            self._erro_relatorio_pdf()
         
         finally:
             # (continua igual)
@@ -1662,6 +2044,22 @@ class FinancialApp:
                     os.remove(arquivo)
 
         self.page.update()
+
+    def _erro_relatorio_pdf(self):
+        # Chamar dentro do tratamento da exceção (mostra o traceback atual)
+        traceback_str = traceback.format_exc()
+        print(f"ERRO CRÍTICO AO GERAR PDF: {traceback_str}")
+        dlg_erro = ft.AlertDialog(
+            modal=True, 
+            title=ft.Text("Ocorreu um Erro ao Gerar o PDF"), 
+            content=ft.Column([
+                ft.Text("Por favor, envie um print desta tela para o desenvolvedor."), 
+                ft.TextField(value=traceback_str, multiline=True, read_only=True, filled=True)
+            ], tight=True, scroll=ft.ScrollMode.AUTO), 
+            actions=[ft.TextButton("Fechar", on_click=lambda _: self.page.close(dlg_erro))]
+        )
+        self.page.open(dlg_erro)
+        self.page.update()
     
     def _gerar_relatorio_tipo(self, pdf, dados_para_resumo, tipo_filtro, grafico_temp_path):
         """Gera análise por tipo (Receita ou Despesa) no documento PDF."""
@@ -1681,17 +2079,15 @@ class FinancialApp:
             pdf.image(grafico_temp_path, x=10, y=None, w=180)
 
 
-    def _gerar_relatorio_categoria(self, pdf, transacoes_relatorio, transacoes_no_periodo, cat_filtro, tipo_filtro):
+    def _gerar_relatorio_categoria(self, pdf, transacoes_relatorio, estatisticas, total_do_tipo_no_periodo, tipo_filtro):
         """Gera análise específica para uma categoria no documento PDF."""
-        total_categoria = sum(float(t['valor']) for t in transacoes_relatorio)
-        num_transacoes = len(transacoes_relatorio)
-        media_transacao = total_categoria / num_transacoes if num_transacoes > 0 else 0
-        maior_transacao = max(transacoes_relatorio, key=lambda x: float(x['valor']))
-        menor_transacao = min(transacoes_relatorio, key=lambda x: float(x['valor']))
-        
-        total_do_tipo_no_periodo = sum(
-            float(t['valor']) for t in transacoes_no_periodo if t['tipo'] == tipo_filtro
-        )
+        total_categoria = estatisticas['total']
+        num_transacoes = estatisticas['quantidade']
+        media_transacao = estatisticas['media']
+        # Só as descrições vêm das linhas; os valores já vêm agregados do banco
+        maior_transacao = next(t for t in transacoes_relatorio if t.valor == estatisticas['maximo'])
+        menor_transacao = next(t for t in transacoes_relatorio if t.valor == estatisticas['minimo'])
+        
         relevancia = (total_categoria / total_do_tipo_no_periodo * 100) if total_do_tipo_no_periodo > 0 else 0
         
         if tipo_filtro == "Receita":
@@ -1711,8 +2107,8 @@ class FinancialApp:
         pdf.cell(0, 7, f"- {texto_total} na Categoria: R$ {total_categoria:,.2f}", 0, 1, "L")
         pdf.cell(0, 7, f"- Número de Transações: {num_transacoes}", 0, 1, "L")
         pdf.cell(0, 7, f"- {texto_media} por Transação: R$ {media_transacao:,.2f}", 0, 1, "L")
-        pdf.cell(0, 7, f"- {texto_maior}: R$ {float(maior_transacao['valor']):,.2f} ({maior_transacao['descricao'].encode('latin-1', 'replace').decode('latin-1')})", 0, 1, "L")
-        pdf.cell(0, 7, f"- {texto_menor}: R$ {float(menor_transacao['valor']):,.2f} ({menor_transacao['descricao'].encode('latin-1', 'replace').decode('latin-1')})", 0, 1, "L")
+        pdf.cell(0, 7, f"- {texto_maior}: R$ {maior_transacao.valor:,.2f} ({maior_transacao.descricao.encode('latin-1', 'replace').decode('latin-1')})", 0, 1, "L")
+        pdf.cell(0, 7, f"- {texto_menor}: R$ {menor_transacao.valor:,.2f} ({menor_transacao.descricao.encode('latin-1', 'replace').decode('latin-1')})", 0, 1, "L")
         pdf.cell(0, 7, f"- Relevância: Esta categoria representa {relevancia:.1f}% do total de suas {texto_relevancia} no período.", 0, 1, "L")
         pdf.ln(10)
     def _gerar_lista_de_totais_por_categoria(self, pdf, dados_categoria):
@@ -1750,20 +2146,21 @@ class FinancialApp:
         
         # Linhas da tabela
         pdf.set_font("DejaVu", "", 10)
-        for t in sorted(transacoes_relatorio, key=lambda x: datetime.strptime(x['data'], "%d/%m/%Y")):
+        # As transações vêm do banco da mais recente para a mais antiga: basta inverter
+        for t in reversed(transacoes_relatorio):
             # Usando encode para garantir que caracteres especiais sejam processados
-            descricao = t['descricao'].encode('latin-1', 'replace').decode('latin-1')
-            categoria = t['categoria'].encode('latin-1', 'replace').decode('latin-1')
+            descricao = t.descricao.encode('latin-1', 'replace').decode('latin-1')
+            categoria = t.categoria.encode('latin-1', 'replace').decode('latin-1')
             
             # Definir cor do texto (opcional, mas bom para visualização)
-            if t['tipo'] == 'Receita':
+            if t.tipo == 'Receita':
                 pdf.set_text_color(0, 128, 0) # Verde
-                valor_str = f"+{float(t['valor']):,.2f}"
+                valor_str = f"+{t.valor:,.2f}"
             else:
                 pdf.set_text_color(255, 0, 0) # Vermelho
-                valor_str = f"-{float(t['valor']):,.2f}"
+                valor_str = f"-{t.valor:,.2f}"
             
-            pdf.cell(25, 8, t['data'], 1)
+            pdf.cell(25, 8, formatar_data(t.data), 1)
             pdf.cell(85, 8, descricao, 1)
             pdf.cell(35, 8, categoria, 1)
             pdf.cell(40, 8, valor_str, 1)
@@ -1821,18 +2218,30 @@ class FinancialApp:
             self.page.update()
             return
 
+        self.barra_backup.value = 0
+        self.barra_backup.visible = True
+        self.txt_status_backup.value = "Copiando dados..."
+        self.txt_status_backup.visible = True
+        self.page.update()
+
+        # A cópia roda fora da thread da interface; o app continua utilizável
+        self.page.run_thread(self._executar_backup, e.path)
+
+    def _executar_backup(self, destino):
+        def progresso(fracao):
+            self.barra_backup.value = fracao
+            self.txt_status_backup.value = f"Copiando dados... {fracao:.0%}"
+            self.page.update()
+
         try:
-            # O arquivo de banco de dados do app
-            origem = "financeiro.db"
-            # O local que o usuário escolheu
-            destino = e.path
-            
-            shutil.copy(origem, destino)
-            
+            db.fazer_backup_db(self.page, destino, ao_progresso=progresso)
             self.page.snack_bar = ft.SnackBar(ft.Text(f"Backup salvo com sucesso em: {destino}"), bgcolor="green")
         except Exception as ex:
+            print(f"ERRO NO BACKUP: {traceback.format_exc()}")
             self.page.snack_bar = ft.SnackBar(ft.Text(f"Erro ao salvar backup: {ex}"), bgcolor="red")
-        
+
+        self.barra_backup.visible = False
+        self.txt_status_backup.visible = False
         self.page.snack_bar.open = True
         self.page.update()
 
@@ -1870,29 +2279,111 @@ class FinancialApp:
             self.page.update()
             return
             
-        try:
-            # O arquivo de backup que o usuário escolheu
-            origem = e.files[0].path
-            # O local do banco de dados do app
-            destino = "financeiro.db"
+        self.barra_backup.value = None
+        self.barra_backup.visible = True
+        self.txt_status_backup.value = "Validando o backup..."
+        self.txt_status_backup.visible = True
+        self.page.update()
 
-            # Aqui seria um bom lugar para fechar a conexão com o banco, se o seu app a mantivesse aberta.
-            # Como suas funções de banco de dados abrem e fecham a cada chamada, não é estritamente necessário.
-            
-            shutil.copy(origem, destino)
-            
-            # Recarregar todos os dados da aplicação do novo banco
-            self.carregar_dados_iniciais()
-            self.carregar_metas()
-            self.carregar_e_exibir_categorias()
+        # Validação, cópia e migração rodam na thread de escrita, depois das gravações já pedidas
+        self.executor.gravar(self._executar_restauracao, e.files[0].path)
 
-            self.page.snack_bar = ft.SnackBar(ft.Text("Backup restaurado com sucesso!"), bgcolor="green")
+    def _executar_restauracao(self, origem):
+        def progresso(etapa, fracao):
+            self.barra_backup.value = fracao
+            self.txt_status_backup.value = etapa
+            self.page.update()
+
+        try:
+            alteradas = db.restaurar_backup_db(
+                self.page, origem, ao_progresso=progresso,
+                pausar_leituras=self.executor.leituras_pausadas,
+            )
+
+            # Recarrega só o que mudou no banco restaurado
+            if "transacoes" in alteradas:
+                self.armazem.limpar()
+                self.carregar_dados_iniciais()
+            if "metas" in alteradas:
+                self.carregar_metas()
+            if "categorias" in alteradas:
+                self.carregar_e_exibir_categorias()
+                self.atualizar_opcoes_categoria(None)
+            if "configuracoes" in alteradas:
+                self.carregar_timestamp_salvo()
+
+            mensagem = "Backup restaurado com sucesso!" if alteradas else "Backup restaurado (igual aos dados atuais)."
+            self.page.snack_bar = ft.SnackBar(ft.Text(mensagem), bgcolor="green")
+        except ValueError as ex:
+            self.page.snack_bar = ft.SnackBar(ft.Text(f"Backup inválido: {ex}"), bgcolor="red")
         except Exception as ex:
+            print(f"ERRO NA RESTAURAÇÃO: {traceback.format_exc()}")
             self.page.snack_bar = ft.SnackBar(ft.Text(f"Erro ao restaurar backup: {ex}"), bgcolor="red")
 
+        self.barra_backup.visible = False
+        self.txt_status_backup.visible = False
         self.page.snack_bar.open = True
         self.page.update()
 
+    # =============================================================================
+    # MÉTODOS DE IMPORTAÇÃO DE EXTRATOS
+    # =============================================================================
+
+    def iniciar_importacao(self, e):
+        """Abre o seletor de arquivos para escolher o extrato a importar."""
+        self.file_picker_importar.pick_files(
+            dialog_title="Selecione o extrato (CSV ou OFX)",
+            allow_multiple=False,
+            allowed_extensions=["csv", "ofx"]
+        )
+
+    def importacao_selecionada(self, e: ft.FilePickerResultEvent):
+        """Callback executado após o usuário escolher o extrato."""
+        if not e.files:
+            self.page.snack_bar = ft.SnackBar(ft.Text("Importação cancelada."), bgcolor="orange")
+            self.page.snack_bar.open = True
+            self.page.update()
+            return
+
+        self.barra_importacao.value = 0
+        self.barra_importacao.visible = True
+        self.txt_status_importacao.value = "Importando..."
+        self.txt_status_importacao.visible = True
+        self.page.update()
+
+        # A importação roda na thread de escrita, fora da thread da interface
+        self.executor.gravar(self._executar_importacao, e.files[0].path)
+
+    def _executar_importacao(self, caminho):
+        def progresso(fracao, resultado):
+            self.barra_importacao.value = fracao
+            self.txt_status_importacao.value = (
+                f"{resultado['importadas']} importadas, {resultado['duplicadas']} duplicadas, "
+                f"{resultado['rejeitadas']} rejeitadas"
+            )
+            self.page.update()
+
+        try:
+            resultado = importacao.importar_extrato(self.page, caminho, ao_progresso=progresso)
+            mensagem = f"{resultado['importadas']} transações importadas"
+            if resultado["duplicadas"]:
+                mensagem += f", {resultado['duplicadas']} já existentes ignoradas"
+            if resultado["rejeitadas"]:
+                mensagem += f", {resultado['rejeitadas']} rejeitadas (ex.: {resultado['erros'][0]})"
+                print(f"ERROS NA IMPORTAÇÃO: {resultado['erros']}")
+            self.page.snack_bar = ft.SnackBar(ft.Text(mensagem), bgcolor="green")
+            if resultado["importadas"]:
+                self.atualizar_timestamp_permanente()
+        except Exception as ex:
+            print(f"ERRO AO IMPORTAR: {traceback.format_exc()}")
+            self.page.snack_bar = ft.SnackBar(ft.Text(f"Erro ao importar extrato: {ex}"), bgcolor="red")
+
+        self.barra_importacao.visible = False
+        self.txt_status_importacao.visible = False
+        self.page.snack_bar.open = True
+        self.armazem.limpar()
+        self.carregar_dados_iniciais()
+
     # =============================================================================
     # MÉTODO DE NAVEGAÇÃO
     # =============================================================================
@@ -1933,4 +2424,6 @@ def main(page: ft.Page):
     login_screen(page, on_success=iniciar_app)
 
 if __name__ == "__main__":
+    # Só o app grava o log de diagnóstico; as ferramentas importam o banco sem ele
+    diagnostico.ativar_log()
     ft.app(target=main)
\ No newline at end of file
@@ -0,0 +1,59 @@
+# modelos.py
+#
+# Registros devolvidos pelas consultas do banco.
+# São tuplas nomeadas: imutáveis, sem um dict por linha, e com os campos já
+# convertidos (valores numéricos, datas como date), para que a interface não
+# precise converter nada ao somar, ordenar ou exibir.
+
+from datetime import date
+from typing import NamedTuple
+
+
+class Transacao(NamedTuple):
+    id: int
+    tipo: str
+    descricao: str
+    valor_centavos: int
+    categoria: str
+    data: date
+
+    @property
+    def valor(self):
+        """Valor em reais"""
+        return self.valor_centavos / 100
+
+
+class Categoria(NamedTuple):
+    id: int
+    nome: str
+    tipo: str
+
+
+class Meta(NamedTuple):
+    id: int
+    nome: str
+    valor_objetivo: float
+    valor_atual: float
+
+
+class RegistroCategorias(NamedTuple):
+    versao: int                 # muda a cada recarga; permite saber se a lista exibida está atual
+    categorias: tuple           # Categoria, em ordem de nome
+    tipo_por_nome: dict         # nome -> "Receita" / "Despesa"
+    nomes_por_tipo: dict        # tipo -> tupla de nomes em ordem
+
+
+class ResumoMes(NamedTuple):
+    """Totais de um mês, calculados numa única passada e compartilhados pelos cards e gráficos"""
+    total_por_tipo: dict            # tipo -> total em reais ("Receita" e "Despesa" sempre presentes)
+    quantidade_por_tipo: dict       # tipo -> número de transações
+    total_por_categoria: dict       # tipo -> {categoria: total em reais}, categorias em ordem de nome
+    quantidade_por_categoria: dict  # tipo -> {categoria: número de transações}
+
+    @property
+    def saldo(self):
+        return self.total_por_tipo["Receita"] - self.total_por_tipo["Despesa"]
+
+    def categorias(self, tipo):
+        """Categorias do tipo com movimento no mês, em ordem de nome"""
+        return list(self.total_por_categoria.get(tipo, {}))